@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+The benchmark cases.
+
+Each case is registered under a name with a setup function, which builds
+the input (not timed) and returns the callable to time. The fixed cases are
+the systems of the doctests and notebooks, the families grow in the order
+of the derivatives, the number of functions and the number of independent
+variables.
+"""
+import pathlib
+import sys
+
+import sage.all
+from sage.calculus.var import var, function
+from sage.calculus.functional import diff
+from sage.matrix.constructor import Matrix
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent
+                       / "notebooks"))
+
+from delierium.MatrixOrder import Context, Mgrlex, Mgrevlex
+from delierium.JanetBasis import (Janet_Basis, CompleteSystem,
+                                  _Differential_Polynomial)
+from delierium.Infinitesimals import infinitesimalsODE
+from delierium.DerivativeOperators import FrechetD, EulerD
+from delierium.RandomSystems import random_system
+
+CASES = {}
+
+ORDERS = {"Mgrlex": Mgrlex, "Mgrevlex": Mgrevlex}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _janet(name, system):
+    for oname, order in ORDERS.items():
+        def setup(order=order):
+            S, dependent, independent = system()
+            return lambda: Janet_Basis(S, dependent, independent, order)
+        CASES["%s/%s" % (name, oname)] = setup
+
+
+def system_2_24():
+    from System_2_24 import system_2_24, w, z, vars
+    return system_2_24, (w, z), vars
+
+
+def system_2_25():
+    from System_2_25 import system_2_25, w, z, vars
+    return system_2_25, (w, z), vars
+
+
+_janet("janet/system_2_24", system_2_24)
+_janet("janet/system_2_25", system_2_25)
+
+
+def _complete(dps, ctx):
+    '''CompleteSystem on the same polynomials in every run, the
+    prolongations they remember are dropped first so each run is cold'''
+    def run():
+        for dp in dps:
+            dp.forget_prolongations()
+        return CompleteSystem(dps, ctx)
+    return run
+
+
+@case("complete/schwarz_C1")
+def complete_schwarz_c1():
+    tvars = var("x y z")
+    x, y, z = tvars
+    w = function("w")(*tvars)
+    ctx = Context((w,), tvars, Mgrlex)
+    dps = [_Differential_Polynomial(_, ctx) for _ in
+           [diff(w, x, x, x, y, y, z, z), diff(w, x, x, x, z, z, z),
+            diff(w, x, y, z, z, z), diff(w, x, y)]]
+    return _complete(dps, ctx)
+
+
+@case("complete/schwarz_p54")
+def complete_schwarz_p54():
+    x, y = var("x y")
+    w = function("w")(x, y)
+    z = function("z")(x, y)
+    g1 = diff(z, y, y) + diff(z, y)/(2*y)
+    g5 = diff(z, x, x, x) + diff(w, y, y)*8*y**2 + diff(w, x, x)/y - \
+        diff(z, x, y)*4*y**2 - diff(z, x)*32*y - 16*w
+    g6 = diff(z, x, x, y) - diff(z, y, y)*4*y**2 - diff(z, y)*8*y
+    ctx = Context((w, z), (x, y), Mgrlex)
+    dps = [_Differential_Polynomial(_, ctx) for _ in [g1, g5, g6]]
+    return _complete(dps, ctx)
+
+
+@case("infinitesimals/arrigo_2_20")
+def infinitesimals_arrigo():
+    x = var("x")
+    y = function("y")
+    ode = diff(y(x), x, 3) + y(x) * diff(y(x), x, 2)
+    return lambda: infinitesimalsODE(ode, y, x)
+
+
+@case("operators/EulerD")
+def euler_d():
+    t = var("t")
+    u = function("u")
+    v = function("v")
+    L1 = u(t)*v(t) + diff(u(t), t)**2 + diff(v(t), t)**2 - u(t)**2 - v(t)**2
+    L2 = u(t)*v(t) + diff(u(t), t)**2 + diff(v(t), t)**2 + \
+        2*diff(u(t), t) * diff(v(t), t)
+    return lambda: (EulerD(L1, (u, v), t), EulerD(L2, (u, v), t))
+
+
+@case("operators/FrechetD")
+def frechet_d():
+    x, t = var("x t")
+    u, v, w1, w2 = [function(_) for _ in ("u", "v", "w1", "w2")]
+    eqsys = [diff(v(x, t), x) - u(x, t),
+             diff(v(x, t), t) - diff(u(x, t), x)/(u(x, t)**2)]
+    return lambda: Matrix(FrechetD(eqsys, [u, v], [x, t], [w1, w2]))
+
+
+def order_family(k):
+    '''w_{x^k} = y w, w_y = w: the integrability condition of order k+1
+    forces w = 0'''
+    x, y = var("x y")
+    w = function("w")(x, y)
+    return [diff(w, *[x]*k) - y*w, diff(w, y) - w], (w,), (x, y)
+
+
+def functions_family(m):
+    '''a chain f_i,x = f_{i+1}, f_i,y = x f_i of m functions'''
+    x, y = var("x y")
+    fs = [function("f%s" % i)(x, y) for i in range(m)]
+    S = [diff(fs[i], x) - fs[i+1] for i in range(m - 1)] + \
+        [diff(f, y) - x*f for f in fs]
+    return S, fs, (x, y)
+
+
+def independents_family(n):
+    '''w_{x_i} = x_{i+1} w for n independent variables x_0, ..., x_{n-1}'''
+    xs = var(" ".join("x%s" % i for i in range(n)))
+    xs = xs if isinstance(xs, tuple) else (xs,)
+    w = function("w")(*xs)
+    S = [diff(w, xs[i]) - xs[(i + 1) % n]*w for i in range(n)]
+    return S, (w,), xs
+
+
+def _family(name, family, sizes):
+    for size in sizes:
+        _janet("family/%s/%s" % (name, size),
+               lambda size=size: family(size))
+
+
+_family("order", order_family, (2, 3, 4, 5))
+_family("functions", functions_family, (2, 3, 4))
+_family("independents", independents_family, (2, 3, 4))
+for kind in ("constant", "polynomial"):
+    _family("random/%s" % kind,
+            lambda size, kind=kind: random_system(
+                n_functions=1, n_independents=2, max_order=2,
+                n_equations=size, coefficients=kind, seed=size),
+            (2, 3))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Runs the benchmark cases and compares them with a stored baseline.
+
+    sage -python benchmarks/run.py -o results.json
+    sage -python benchmarks/run.py -k janet/ --baseline benchmarks/baseline.json
+    sage -python benchmarks/run.py --save-baseline benchmarks/baseline.json
+
+Every case is run 'repeat' times. The caches are cleared before each run,
+unless --warm is given, so the numbers are those of a cold start. The
+results contain min/median/mean wall time and the calls of 'eq' and the
+Maxima comparisons behind it (the cache misses) of the fastest run.
+
+With --baseline, the minimum times are compared. A case counts as a
+regression if it is slower than baseline * tolerance, and the exit code is
+1 if there is any regression.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from cases import CASES
+from delierium.Caches import caches
+
+
+def measure(setup, repeat, warm=False):
+    run = setup()
+    times, counters = [], []
+    for _ in range(repeat):
+        if not warm:
+            caches.clear()
+        before = caches["eq"].stats()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        after = caches["eq"].stats()
+        counters.append({
+            "eq_calls": after["hits"] + after["misses"] -
+                        before["hits"] - before["misses"],
+            "maxima_comparisons": after["misses"] - before["misses"]})
+    best = min(range(repeat), key=times.__getitem__)
+    return dict({"min": times[best], "median": statistics.median(times),
+                 "mean": statistics.mean(times), "repeat": repeat},
+                **counters[best])
+
+
+def compare(results, baseline, tolerance):
+    '''{name: (baseline, current, ratio, regression)} for all cases in
+    both'''
+    table = {}
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        ratio = r["min"] / b["min"] if b["min"] else float("inf")
+        table[name] = (b["min"], r["min"], ratio, ratio > tolerance)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", default="",
+                        help="run only cases whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--warm", action="store_true",
+                        help="don't clear the caches between runs")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with this result file")
+    parser.add_argument("--save-baseline",
+                        help="write the results as new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="slowdown factor counted as regression")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = sorted(_ for _ in CASES if args.filter in _)
+    if args.list:
+        print("\n".join(names))
+        return 0
+    results = {}
+    for name in names:
+        results[name] = measure(CASES[name], args.repeat, args.warm)
+        print("%-45s %10.4fs %8d maxima" %
+              (name, results[name]["min"],
+               results[name]["maxima_comparisons"]))
+    document = {"meta": {"python": platform.python_version(),
+                         "platform": platform.platform(),
+                         "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+                "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(document, f, indent=1)
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print()
+        for name, (b, c, ratio, slow) in compare(results, baseline,
+                                                 args.tolerance).items():
+            print("%-45s %10.4fs -> %10.4fs %6.2fx%s" %
+                  (name, b, c, ratio, "  REGRESSION" if slow else ""))
+            status = status or int(slow)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
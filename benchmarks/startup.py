@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Measures the import time of delierium in fresh interpreters.
+
+    sage -python benchmarks/startup.py
+    sage -python benchmarks/startup.py -r 10 -o startup.json
+
+Each statement is run 'repeat' times in a new process (so nothing is cached
+in sys.modules), the time is that of the statement alone, without the
+startup of the interpreter. Besides the times, the heavy dependencies
+pulled in by each statement are reported; IPython, the graphs of Sage and
+anytree should only show up when the rich output is used.
+"""
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+STATEMENTS = {
+    "import": "import delierium",
+    "caches": "import delierium; delierium.caches",
+    "janet_basis": "import delierium; delierium.Janet_Basis",
+    "batch": "import delierium; delierium.janet_basis_many",
+    "infinitesimals": "import delierium.Infinitesimals",
+}
+
+HEAVY = ["sage.all", "IPython", "sage.graphs.graph", "anytree",
+         "sage.repl.rich_output"]
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"time": elapsed,
+                  "modules": [m for m in json.loads(sys.argv[2])
+                              if m in sys.modules]}))
+'''
+
+
+def measure(statement, repeat):
+    times, modules = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE, statement,
+                              json.dumps(HEAVY)],
+                             cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout
+        result = json.loads(out.splitlines()[-1])
+        times.append(result["time"])
+        modules = result["modules"]
+    return {"min": min(times), "median": statistics.median(times),
+            "repeat": repeat, "modules": modules}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", default="",
+                        help="run only statements whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, statement in STATEMENTS.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(statement, args.repeat)
+        print("%-20s %10.4fs  %s" % (name, results[name]["min"],
+                                     " ".join(results[name]["modules"])))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version, "results": results}, f,
+                      indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Computing many Janet bases.
+
+janet_basis_many spreads the systems over a pool of long-lived worker
+processes. Sage is set up once per worker and the caches of a worker (see
+Caches) stay warm from one system to the next. The results are streamed
+back as they are finished. An exception only fails its own system, and a
+worker process which dies (e.g. killed for memory) is replaced; the
+systems it might have been working on are retried one at a time.
+"""
+import traceback
+from collections import deque, namedtuple
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+from concurrent.futures.process import BrokenProcessPool
+import os
+
+try:
+    from delierium.JanetBasis import Janet_Basis
+except ModuleNotFoundError:
+    from JanetBasis import Janet_Basis
+
+BatchResult = namedtuple("BatchResult", ["index", "basis", "error"])
+BatchResult.__doc__ = '''result for the system with the given index in the
+input: the Janet_Basis, or None and the formatted error'''
+
+
+def _warm_up():
+    import sage.all
+
+
+def _solve(index, system, options):
+    '''computes the Janet basis of one system, errors are returned'''
+    try:
+        S, dependent, independent = system[:3]
+        kwargs = dict(options, **(system[3] if len(system) > 3 else {}))
+        return BatchResult(index, Janet_Basis(S, dependent, independent,
+                                              **kwargs), None)
+    except Exception:
+        return BatchResult(index, None, traceback.format_exc())
+
+
+def janet_basis_many(systems, jobs=None, ordered=False, retries=1,
+                     max_tasks_per_child=None, **options):
+    '''Computes the Janet bases of many systems, yields a BatchResult for
+    each of them.
+
+    Parameters:
+        * systems: iterable of (S, dependent, independent) or
+          (S, dependent, independent, options)
+        * jobs: number of worker processes, default is the number of CPUs,
+          1 computes everything in this process
+        * ordered: yield the results in the order of the systems instead of
+          as soon as they are finished
+        * retries: how often a system is tried again after its worker
+          process died while it was computed alone
+        * max_tasks_per_child: replace workers after that many systems
+          (limits memory growth, needs Python >= 3.11)
+        * options: passed to Janet_Basis for all systems (e.g. sort_order),
+          the options of a single system take precedence
+
+    >>> vars = var("x y")
+    >>> w = function("w")(*vars)
+    >>> systems = [([diff(w, x) - w, diff(w, y)], (w,), vars),
+    ...            ([diff(w, x, x)], (), vars),
+    ...            ([diff(w, y) - x*w], (w,), vars)]
+    >>> for r in janet_basis_many(systems, jobs=2, ordered=True):
+    ...     print(r.index, r.error is None, r.basis and r.basis.S[0])
+    0 True diff(w(x, y), y)
+    1 False None
+    2 True diff(w(x, y), y) + (-x) * w(x, y)
+
+    A system which kills its worker only fails itself, the systems pending
+    at the same time are computed again without using up their tries:
+
+    >>> import os
+    >>> class Poison:
+    ...     def __reduce__(self):
+    ...         return os._exit, (1,)
+    >>> systems = [systems[0], ([Poison()], (w,), vars), systems[2]] * 2
+    >>> for r in janet_basis_many(systems, jobs=3, ordered=True):
+    ...     print(r.index, r.error or r.basis.S[0])
+    0 diff(w(x, y), y)
+    1 worker process died (2 tries)
+    2 diff(w(x, y), y) + (-x) * w(x, y)
+    3 diff(w(x, y), y)
+    4 worker process died (2 tries)
+    5 diff(w(x, y), y) + (-x) * w(x, y)
+    '''
+    jobs = jobs or os.cpu_count()
+    systems = enumerate(systems)
+    if jobs == 1:
+        results = (_solve(i, s, options) for i, s in systems)
+    else:
+        results = _pooled(systems, jobs, retries, max_tasks_per_child,
+                          options)
+    if not ordered:
+        yield from results
+        return
+    waiting, next_index = {}, 0
+    for r in results:
+        waiting[r.index] = r
+        while next_index in waiting:
+            yield waiting.pop(next_index)
+            next_index += 1
+
+
+def _pool(jobs, max_tasks_per_child):
+    kwargs = {"max_workers": jobs, "initializer": _warm_up}
+    if max_tasks_per_child:
+        kwargs["max_tasks_per_child"] = max_tasks_per_child
+    return ProcessPoolExecutor(**kwargs)
+
+
+def _result(f, i):
+    '''the BatchResult of a finished future. Errors outside of the
+    computation (e.g. a system or a basis which can't be pickled) only
+    fail system i, a dead worker raises BrokenProcessPool'''
+    try:
+        return f.result()
+    except BrokenProcessPool:
+        raise
+    except Exception:
+        return BatchResult(i, None, traceback.format_exc())
+
+
+def _pooled(systems, jobs, retries, max_tasks_per_child, options):
+    # when a worker dies every pending system fails with it. Those systems
+    # are not charged, they are run again one at a time and only a system
+    # which kills its worker while running alone uses up its tries.
+    pool    = _pool(jobs, max_tasks_per_child)
+    suspect = deque()
+    pending = {}
+    try:
+        while True:
+            alone = bool(suspect)
+            if alone:
+                if not pending:
+                    i, s, attempt = suspect.popleft()
+                    pending[pool.submit(_solve, i, s, options)] = (i, s,
+                                                                  attempt)
+            else:
+                # keep the workers busy without pickling all systems at once
+                while len(pending) < 2 * jobs:
+                    try:
+                        i, s = next(systems)
+                    except StopIteration:
+                        break
+                    pending[pool.submit(_solve, i, s, options)] = (i, s, 0)
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for f in done:
+                i, s, attempt = pending.pop(f)
+                try:
+                    result = _result(f, i)
+                except BrokenProcessPool:
+                    broken = True
+                    if not alone:
+                        suspect.append((i, s, attempt))
+                    elif attempt < retries:
+                        suspect.append((i, s, attempt + 1))
+                    else:
+                        yield BatchResult(i, None,
+                                          "worker process died (%s tries)" %
+                                          (attempt + 1))
+                    continue
+                yield result
+            if broken:
+                # the other pending systems are lost as well unless they
+                # are already finished
+                for f, (i, s, attempt) in pending.items():
+                    if f.done() and not isinstance(f.exception(),
+                                                   BrokenProcessPool):
+                        yield _result(f, i)
+                    else:
+                        suspect.append((i, s, attempt))
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _pool(jobs, max_tasks_per_child)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Bounded caches for the memoized helpers.
+
+All caches are registered with one CacheManager ('caches'), which gives
+access to their hit/miss/size counters and to their bounds at runtime:
+
+    caches.stats()                         -> {name: {...}}
+    caches.configure("eq", maxsize=10**5)
+    caches.release(context)                -> drop everything of a context
+    with caches.scope(): ...               -> clear all caches on exit
+
+A cache is either global or scoped. A scoped cache keeps one LRU table per
+value of one of the arguments (the context for most helpers), so the
+entries of a context can be dropped in one go and only a limited number of
+contexts is kept at all. ScopedTables are the same for lookups on a hot
+path, their owners look up in plain dicts.
+"""
+import functools
+import inspect
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_missing = object()
+# separates the positional from the keyword arguments in a key
+_keywords = object()
+
+
+class LRUCache:
+    '''A mapping of bounded size which evicts the least recently used entry,
+    maxsize None means unbounded.
+
+    >>> c = LRUCache(2)
+    >>> c.store(1, "a"); c.store(2, "b")
+    >>> c.lookup(1)
+    'a'
+    >>> c.store(3, "c")
+    >>> c.lookup(2) is _missing, len(c)
+    (True, 2)
+    >>> sorted(c.stats().items())
+    [('evictions', 1), ('hits', 1), ('maxsize', 2), ('misses', 1), ('size', 2)]
+    '''
+    def __init__(self, maxsize=None):
+        self.maxsize   = maxsize
+        self._data     = OrderedDict()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key):
+        '''the value stored for key or _missing'''
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return _missing
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self.shrink()
+
+    def shrink(self):
+        '''evicts entries until the size bound holds'''
+        if self.maxsize is None:
+            return
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._data),
+                "maxsize": self.maxsize}
+
+
+class CachedFunction:
+    '''A memoized function, the cache is an LRUCache or, if 'scope' is the
+    position of an argument, one LRUCache per value of this argument. At
+    most 'max_scopes' of them are kept, the least recently used scope is
+    dropped first. Keyword arguments are part of the key as with
+    functools.cache, a scope argument may be given by keyword as well.
+
+    cache_clear() is kept for compatibility with functools.cache.
+
+    >>> def power(x, ctx, n=2):
+    ...     return x ** n
+    >>> p = CachedFunction(power, "power", scope=1)
+    >>> p(2, "a"), p(2, ctx="a", n=3), p(2, "a", n=3), p(x=2, ctx="a")
+    (4, 8, 8, 4)
+    >>> p.stats()["scopes"], p.stats()["size"]
+    (1, 4)
+    '''
+    def __init__(self, func, name, maxsize=None, scope=None, max_scopes=None):
+        functools.update_wrapper(self, func)
+        self._func      = func
+        self.name       = name
+        self.maxsize    = maxsize
+        self.scope      = scope
+        self.max_scopes = max_scopes
+        self._dropped   = LRUCache()
+        if scope is None:
+            self._cache = LRUCache(maxsize)
+        else:
+            self._scopes = OrderedDict()
+            self._scope_name = list(
+                inspect.signature(func).parameters)[scope]
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return functools.partial(self, obj)
+
+    def _table(self, args, kwargs):
+        if self.scope is None:
+            return self._cache
+        # a scope argument left to its default is a scope of its own
+        if len(args) > self.scope:
+            s = args[self.scope]
+        else:
+            s = kwargs.get(self._scope_name)
+        try:
+            table = self._scopes[s]
+            self._scopes.move_to_end(s)
+        except KeyError:
+            table = self._scopes[s] = LRUCache(self.maxsize)
+            while self.max_scopes is not None and \
+                    len(self._scopes) > self.max_scopes:
+                self._retire(self._scopes.popitem(last=False)[1])
+        return table
+
+    def _retire(self, table):
+        '''keeps the counters of a table which is dropped'''
+        self._dropped.hits      += table.hits
+        self._dropped.misses    += table.misses
+        self._dropped.evictions += table.evictions + len(table)
+
+    def __call__(self, *args, **kwargs):
+        table = self._table(args, kwargs)
+        key   = args + (_keywords,) + tuple(sorted(kwargs.items())) \
+            if kwargs else args
+        value = table.lookup(key)
+        if value is _missing:
+            value = self._func(*args, **kwargs)
+            table.store(key, value)
+        return value
+
+    def tables(self):
+        if self.scope is None:
+            return [self._cache]
+        return list(self._scopes.values())
+
+    def configure(self, maxsize=_missing, max_scopes=_missing):
+        if maxsize is not _missing:
+            self.maxsize = maxsize
+            for table in self.tables():
+                table.maxsize = maxsize
+                table.shrink()
+        if max_scopes is not _missing and self.scope is not None:
+            self.max_scopes = max_scopes
+            while max_scopes is not None and len(self._scopes) > max_scopes:
+                self._retire(self._scopes.popitem(last=False)[1])
+
+    def release(self, scope):
+        '''drops all entries of a scope'''
+        if self.scope is not None and scope in self._scopes:
+            self._retire(self._scopes.pop(scope))
+
+    def cache_clear(self):
+        if self.scope is None:
+            self._cache.clear()
+        else:
+            for table in self._scopes.values():
+                self._retire(table)
+            self._scopes.clear()
+
+    def stats(self):
+        tables = self.tables() + [self._dropped]
+        result = {"hits": sum(_.hits for _ in tables),
+                  "misses": sum(_.misses for _ in tables),
+                  "evictions": sum(_.evictions for _ in tables),
+                  "size": sum(len(_) for _ in tables),
+                  "maxsize": self.maxsize}
+        if self.scope is not None:
+            result["scopes"]     = len(self._scopes)
+            result["max_scopes"] = self.max_scopes
+        return result
+
+
+class ScopedTables:
+    '''Plain dicts, one per scope, for lookups which are too hot for a
+    CachedFunction. The owner keeps the dict of its scope and looks up
+    itself, only misses go through 'store', which keeps the bounds: a full
+    dict is emptied, and at most 'max_scopes' dicts are kept. A dict which
+    is dropped (release, clear, too many scopes) is emptied in place, so
+    nobody holding it keeps the entries alive. Hits aren't counted.
+
+    >>> t = ScopedTables("squares", maxsize=2, max_scopes=1)
+    >>> a = t.table("a")
+    >>> t.store("a", a, 2, 4); t.store("a", a, 3, 9); a
+    {2: 4, 3: 9}
+    >>> t.store("a", a, 4, 16); a
+    {4: 16}
+    >>> b = t.table("b"); a, t.stats()["evictions"]
+    ({}, 3)
+    >>> t.store("a", a, 5, 25); b is t.table("b"), t.stats()["scopes"]
+    (False, 1)
+    '''
+    def __init__(self, name, maxsize=None, max_scopes=None):
+        self.name       = name
+        self.maxsize    = maxsize
+        self.max_scopes = max_scopes
+        self.misses     = 0
+        self.evictions  = 0
+        self._scopes    = OrderedDict()
+
+    def table(self, scope):
+        '''the dict of a scope'''
+        table = self._scopes.get(scope)
+        if table is None:
+            table = {}
+            self._attach(scope, table)
+        return table
+
+    def _attach(self, scope, table):
+        old = self._scopes.get(scope)
+        if old is not None and old is not table:
+            self._drop(old)
+        self._scopes[scope] = table
+        self._scopes.move_to_end(scope)
+        self._shrink()
+
+    def _drop(self, table):
+        self.evictions += len(table)
+        table.clear()
+
+    def _shrink(self):
+        while self.max_scopes is not None and \
+                len(self._scopes) > self.max_scopes:
+            self._drop(self._scopes.popitem(last=False)[1])
+
+    def store(self, scope, table, key, value):
+        '''stores a missing entry in the dict 'table' of 'scope', a dict
+        which was dropped before becomes the one of its scope again'''
+        if self._scopes.get(scope) is not table:
+            self._attach(scope, table)
+        if self.maxsize is not None and len(table) >= self.maxsize:
+            self._drop(table)
+        table[key] = value
+        self.misses += 1
+
+    def tables(self):
+        return list(self._scopes.values())
+
+    def configure(self, maxsize=_missing, max_scopes=_missing):
+        if maxsize is not _missing:
+            self.maxsize = maxsize
+            for table in self.tables():
+                if maxsize is not None and len(table) > maxsize:
+                    self._drop(table)
+        if max_scopes is not _missing:
+            self.max_scopes = max_scopes
+            self._shrink()
+
+    def release(self, scope):
+        '''drops all entries of a scope'''
+        if scope in self._scopes:
+            self._drop(self._scopes.pop(scope))
+
+    def cache_clear(self):
+        for table in self._scopes.values():
+            self._drop(table)
+        self._scopes.clear()
+
+    def stats(self):
+        return {"hits": None, "misses": self.misses,
+                "evictions": self.evictions,
+                "size": sum(len(_) for _ in self._scopes.values()),
+                "maxsize": self.maxsize, "scopes": len(self._scopes),
+                "max_scopes": self.max_scopes}
+
+
+class CacheManager:
+    '''Registry of all caches.
+
+    >>> m = CacheManager()
+    >>> @m.cached("square", maxsize=2, scope=1, max_scopes=2)
+    ... def square(x, ctx):
+    ...     return x * x
+    >>> [square(2, "a"), square(2, "a"), square(3, "b")]
+    [4, 4, 9]
+    >>> m.stats()["square"]["hits"], m.stats()["square"]["scopes"]
+    (1, 2)
+    >>> m.release("a")
+    >>> m.stats()["square"]["size"]
+    1
+    >>> with m.scope():
+    ...     square(4, "c")
+    16
+    >>> m.stats()["square"]["size"], m.stats()["square"]["misses"]
+    (0, 3)
+    '''
+    def __init__(self):
+        self._caches = {}
+
+    def cached(self, name=None, maxsize=None, scope=None, max_scopes=None):
+        '''decorator turning a function into a registered CachedFunction'''
+        def decorator(func):
+            c = CachedFunction(func, name or func.__qualname__, maxsize,
+                               scope, max_scopes)
+            self._caches[c.name] = c
+            return c
+        return decorator
+
+    def tables(self, name, maxsize=None, max_scopes=None):
+        '''a registered ScopedTables'''
+        t = ScopedTables(name, maxsize, max_scopes)
+        self._caches[name] = t
+        return t
+
+    def __getitem__(self, name):
+        return self._caches[name]
+
+    def names(self):
+        return sorted(self._caches)
+
+    def stats(self):
+        '''{name: counters} of all caches'''
+        return {name: c.stats() for name, c in self._caches.items()}
+
+    def configure(self, name=None, **kwargs):
+        '''sets maxsize and/or max_scopes of one or (without name) all
+        caches'''
+        for c in ([self._caches[name]] if name else self._caches.values()):
+            c.configure(**kwargs)
+
+    def clear(self, name=None):
+        for c in ([self._caches[name]] if name else self._caches.values()):
+            c.cache_clear()
+
+    def release(self, scope):
+        '''drops the entries of a scope (e.g. a context) from all scoped
+        caches'''
+        for c in self._caches.values():
+            c.release(scope)
+
+    @contextmanager
+    def scope(self, scope=None):
+        '''Explicit lifetime: on exit the entries of 'scope' are dropped, or
+        all entries if no scope is given.'''
+        try:
+            yield self
+        finally:
+            if scope is None:
+                self.clear()
+            else:
+                self.release(scope)
+
+
+caches = CacheManager()
+cached = caches.cached
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
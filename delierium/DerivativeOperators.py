@@ -10,7 +10,6 @@ import sage.all
 import sage.symbolic.operators
 from sage.calculus.var import var, function
 from sage.calculus.functional import diff
-from IPython.core.debugger import set_trace
 try:
     from delierium.helpers import is_function
 except ImportError:
@@ -52,6 +51,7 @@ def iter_du_orders(expr, u):
 def func_diff(L, u_in):
     # `u` must be a callable symbolic expression
     # in one variable.
+    from IPython.core.debugger import set_trace
     set_trace()
     if len(u_in.variables()) == 1:
         x = u_in.variables()[0]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Persistent cache for computed Janet bases.
+
+Entries are keyed by a fingerprint, a SHA-256 over a canonical form of the
+input (built by the caller) together with the library version and the
+format of the entries, so a new version never sees the entries of an old
+one. Each entry is a small gzipped JSON file, written atomically, which
+repeats version, format and fingerprint; anything unreadable or not
+matching counts as a miss.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    from delierium._version import __version__
+except ModuleNotFoundError:
+    from _version import __version__
+
+FORMAT = 1
+
+
+def fingerprint(canonical):
+    '''SHA-256 hex digest of a JSON serializable canonical form
+
+    >>> fingerprint(["a", [1, 2]]) == fingerprint(["a", [1, 2]])
+    True
+    >>> fingerprint(["a", [1, 2]]) == fingerprint(["a", [2, 1]])
+    False
+    '''
+    data = json.dumps([__version__, FORMAT, canonical], sort_keys=True,
+                      separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    '''A directory of cached results.
+
+    >>> import tempfile
+    >>> cache = DiskCache(tempfile.mkdtemp())
+    >>> key = fingerprint("some system")
+    >>> cache.get(key) is None
+    True
+    >>> cache.put(key, [[[0, [1, 0]], "1"]])
+    >>> cache.get(key)
+    [[[0, [1, 0]], '1']]
+    >>> key in cache, len(cache)
+    (True, 1)
+    >>> cache.clear(); cache.get(key) is None
+    True
+    '''
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json.gz")
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return sum(len([_ for _ in files if _.endswith(".json.gz")])
+                   for _, _, files in os.walk(self.directory))
+
+    def get(self, key):
+        '''the stored payload, None on a miss'''
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, EOFError, ValueError):
+            return None
+        if not isinstance(entry, dict) or \
+           entry.get("version") != __version__ or \
+           entry.get("format") != FORMAT or entry.get("key") != key:
+            return None
+        return entry.get("payload")
+
+    def put(self, key, payload):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"version": __version__, "format": FORMAT, "key": key,
+                 "payload": payload}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                   suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, \
+                    gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(entry, separators=(",", ":"))
+                        .encode("utf-8"))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    os.unlink(os.path.join(root, name))
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -7,21 +7,16 @@ Created on Fri Jan  7 18:49:33 2022
 """
 
 from itertools import product
-from anytree import Node, RenderTree, AnyNode, NodeMixin, PreOrderIter
 
 import sage.all
 from sage.calculus.functional import diff
 from sage.calculus.var import function, var
-from sage.misc.html import html
 from sage.symbolic.operators import FDerivativeOperator
 from sage.symbolic.relation import solve
 
 from delierium.DerivativeOperators import FrechetD
 from delierium.helpers import latexer, ExpressionTree
 
-from IPython.core.debugger import set_trace
-from IPython.display import Math
-
 def prolongationFunction(f: list, x: list, order) -> list:
     '''
     >>> x, y, z = var("x y z")
@@ -154,6 +149,7 @@ def infinitesimalsODE (ode, dependent, independent, *args, **kw):
     2*y(x)*D[0, 1](phi)(y(x), x) - y(x)*D[1, 1](xi)(y(x), x) + 3*D[0, 1, 1](phi)(y(x), x) - D[1, 1, 1](xi)(y(x), x)
     y(x)*D[1, 1](phi)(y(x), x) + D[1, 1, 1](phi)(y(x), x)
     """
+    from anytree import PreOrderIter
     prolongation = prolongationODE(ode, dependent, independent)[0].expand()
     tree = ExpressionTree(prolongation)         
     mine = [_ for _ in tree.diffs if _.operator().function() in [dependent]]
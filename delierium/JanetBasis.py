@@ -5,32 +5,50 @@
 
 import sage.all
 from sage.calculus.var import var, function
-from sage.misc.reset import reset
 from sage.calculus.functional import diff
+from sage.rings.rational_field import QQ
+from sage.symbolic.ring import SR
+from sage.symbolic.expression import Expression
 try :
     from delierium.helpers import (is_derivative, is_function, eq,
-                                   order_of_derivative, adiff, latexer)
-    from delierium.MatrixOrder import higher, sorter, Context, Mgrlex, Mgrevlex
+                                   order_of_derivative, latexer)
+    from delierium.MatrixOrder import (higher, sorter, Context, Mgrlex,
+                                       Mgrevlex, _Dkey, derivative_to_key,
+                                       key_to_derivative)
+    from delierium.JanetTree import JanetTree
+    from delierium.Caches import cached
+    from delierium.Statistics import Stats
+    from delierium.DiskCache import DiskCache, fingerprint
+    from delierium.SparseLinearAlgebra import (constant_janet_basis,
+                                               eliminate, echelon)
 except ModuleNotFoundError:
     from helpers import (is_derivative, is_function, eq,
-                         order_of_derivative, adiff, latexer)
-    from MatrixOrder import higher, sorter, Context, Mgrlex, Mgrevlex
+                         order_of_derivative, latexer)
+    from MatrixOrder import (higher, sorter, Context, Mgrlex, Mgrevlex,
+                             _Dkey, derivative_to_key, key_to_derivative)
+    from JanetTree import JanetTree
+    from Caches import cached
+    from Statistics import Stats
+    from DiskCache import DiskCache, fingerprint
+    from SparseLinearAlgebra import constant_janet_basis, eliminate, echelon
 
 import functools
+import json
+import time
 from operator import mul
 from collections.abc import Iterable
-from more_itertools import powerset, bucket, flatten
-from itertools import product, islice
-
-from sage.misc.latex import latex
-from sage.misc.html import html
+from collections import namedtuple
+from more_itertools import bucket, flatten
+from itertools import repeat, count
+from heapq import heappush, heappop, heapify
+from bisect import bisect_right
+from contextlib import nullcontext, contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import os
 import re
-from sage.repl.rich_output.pretty_print import pretty_print
-
-from IPython.core.debugger import set_trace
 
 
-@functools.cache
+@cached("func", maxsize=2**12)
 def func(e):
     try:
         return e.operator().function()
@@ -50,25 +68,59 @@ class _Dterm:
         >>> dterm = _Dterm(d,ctx)
         >>> print (dterm)
         (x^2) * diff(f(x, y, z), x, y)
+        >>> dterm._key
+        _Dkey(0, (1, 1, 0))
         '''
-        self._coeff, self._d = 1, 1
+        self._coeff, self._derivative = 1, 1
+        self._key            = None
         self._context        = context
         self._has_minus      = False
         if is_derivative(e) or is_function(e):
-            self._d     = e
+            self._derivative = e
         else:
             r = []
             for o in e.operands():
                 #print (f"{e=}, {o=}")
                 if is_derivative(o) or is_function(o):
-                    self._d = o
+                    self._derivative = o
                 else:
                     if o == -1:
                         self._has_minus = True
                     self._coeff *= o
                     r.append(o)
+        if not isinstance(self._derivative, int):
+            self._key = derivative_to_key(self._derivative, context)
+        if context is not None:
+            self._coeff = context.coefficient(self._coeff)
         self._order      = self._compute_order()
-        self._expression = self._coeff * self._d
+        self._expression = None
+
+    @classmethod
+    def from_key(cls, key, coeff, context):
+        '''builds a term directly from its _Dkey and coefficient, the
+        symbolic derivative is only created if somebody asks for it
+
+        >>> x,y,z = var("x y z")
+        >>> f     = function("f")(x,y,z)
+        >>> ctx   = Context ((f,),(x,y,z))
+        >>> print (_Dterm.from_key(_Dkey(0, (0, 2, 1)), x, ctx))
+        (x) * diff(f(x, y, z), y, y, z)
+        '''
+        t = cls.__new__(cls)
+        t._coeff, t._derivative = coeff, None
+        t._key        = key
+        t._context    = context
+        t._has_minus  = False
+        t._order      = list(key.order) if key is not None else \
+            [0] * len(context._independent)
+        t._expression = None
+        return t
+
+    @property
+    def _d(self):
+        if self._derivative is None:
+            self._derivative = key_to_derivative(self._key, self._context)
+        return self._derivative
 
     def __str__(self):
         try:
@@ -77,44 +129,47 @@ class _Dterm:
             if eq (self._coeff, 1):
                 return f"{self._d}"
             else:
-                return f"({self._coeff}) * { self._d}"
+                return f"({self._context.symbolic(self._coeff)}) * { self._d}"
     def term(self):
-        return self._coeff * self._d
+        return self._context.symbolic(self._coeff) * self._d
     def expression(self):
+        if self._expression is None:
+            self._expression = self.term()
         return self._expression
     def _compute_order(self):
         """computes the monomial tuple from the derivative part"""
-        if is_derivative(self._d):
-            return order_of_derivative(self._d, len(self._context._independent))
+        if self._key is not None:
+            return list(self._key.order)
         else:
             return [0] * len(self._context._independent)
     def order(self):
         return self._order
+    def key(self):
+        return self._key
     def is_coefficient(self):
-        # XXX nonsense
-        return self._d == 1
+        return self._key is None
 
     def __nonzero__(self):
-        return self._d != 1
+        return self._key is not None
 
     def derivative(self):
         return self._d
 
     def is_monic(self):
-        return self._d != 1 and bool(self._coeff == 1)
+        return self._key is not None and bool(self._coeff == 1)
 
     def __lt__(self, other):
-        return not eq(self, other) and higher(self, other, self._context)
+        return self._key != other._key and \
+            higher(self._key, other._key, self._context)
 
-    @functools.cache
     def __eq__(self, other):
-        return eq(self._d, other._d) and eq(self._coeff, other._coeff)
+        return self._key == other._key and eq(self._coeff, other._coeff)
 
     def show(self, rich=True):
         if not rich:
             return str(self)        
-        
-        dlatex = latex(self._coeff)
+        from sage.misc.latex import latex
+        dlatex = latex(self._context.symbolic(self._coeff))
         denominator_pattern = re.compile(r"(-)?\\frac\{.*}{(.* )?(?P<nomfunc>\w+)?\\left\((?P<vars>[\w ,]*)\\right\).*")
         res     = []
         funcname= ""
@@ -127,13 +182,18 @@ class _Dterm:
             return latexer(self._d)
     
     def __hash__(self):
-        return hash(self._expression)
+        return hash(self._key)
 
 
 class _Differential_Polynomial:
     def __init__(self, e, context):
         self._context = context
-        self._p = []
+        self._terms   = {}
+        self._lead    = None
+        self._sorted  = None
+        self._expression = None
+        self._ancestor   = None
+        self._prolongations = {}
         if not eq(0, e):
             self._init(e.expand())
     def _init(self, e):
@@ -143,11 +203,14 @@ class _Differential_Polynomial:
    #             is_function(o)
    #     operands = e.operands()
    #     operator = e.operator()
-        if is_derivative(e) or is_function(e):
-            self._p.append(_Dterm(e, self._context))
-        elif e.operator().__name__ == 'mul_vararg':
-            self._p.append(_Dterm(e, self._context))
+        if is_derivative(e) or is_function(e) or \
+           e.operator().__name__ == 'mul_vararg':
+            t = _Dterm(e, self._context)
+            self._terms[t._key] = t
         else:
+            # like terms are collected by their _Dkey, the symbolic
+            # derivative is kept for printing
+            coeffs, derivatives = {}, {}
             for s in e.operands():
                 coeff, d = [], []
                 if is_derivative(s) or is_function(s):
@@ -155,28 +218,70 @@ class _Differential_Polynomial:
                 else:
                     for item in s.operands():
                         (d if (is_derivative(item) or self.ctxfunc(item)) else coeff).append(item)
-                coeff = functools.reduce(mul, coeff, 1)
-                found = False
-                if d:
-                    for _p in self._p:
-                        if eq(_p._d, d[0]):
-                            _p._coeff += coeff
-                            found = True
-                            break
-                if not found:
-                    if d:
-                        self._p.append(_Dterm(coeff * d[0], self._context))
-                    else:
-                        self._p.append(_Dterm(coeff, self._context))
-        self._p.sort(key=functools.cmp_to_key(
-            lambda item1, item2: sorter(item1._d, item2._d, self._context)
-            ), reverse=True
-        )
+                coeff = self._context.coefficient(
+                    functools.reduce(mul, coeff, SR(1)))
+                k = derivative_to_key(d[0], self._context) if d else None
+                if k in coeffs:
+                    coeffs[k] += coeff
+                else:
+                    coeffs[k] = coeff
+                    derivatives[k] = d[0] if d else 1
+            for k, c in coeffs.items():
+                t = _Dterm.from_key(k, c, self._context)
+                t._derivative = derivatives[k]
+                self._terms[k] = t
         self.normalize()
 
     def expression(self):
+        if self._expression is None:
+            self._expression = sum(_.expression() for _ in self._p)
         return self._expression
 
+    @property
+    def _p(self):
+        '''the terms, highest derivative first; only the leading term is
+        found when the polynomial is built, the rest is sorted on demand
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y))
+        >>> dp = _Differential_Polynomial(x*w + y*w + diff(w, x), ctx)
+        >>> dp._sorted is None, dp.Lkey()
+        (True, _Dkey(0, (1, 0)))
+        >>> print(dp); dp._p[0] is dp._lead
+        diff(w(x, y), x) + (x + y) * w(x, y)
+        True
+        '''
+        if self._sorted is None:
+            rank = self._context.rank
+            self._sorted = sorted(self._terms.values(),
+                                  key=lambda item: rank(item._key),
+                                  reverse=True)
+        return self._sorted
+
+    @classmethod
+    def from_terms(cls, terms, context):
+        '''builds a (normalized) polynomial from a dict {_Dkey: coefficient}
+        without going through a symbolic expression
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y))
+        >>> print(_Differential_Polynomial.from_terms(
+        ...     {_Dkey(0, (0, 0)): QQ(3), _Dkey(0, (1, 0)): QQ(2)}, ctx))
+        diff(w(x, y), x) + (3/2) * w(x, y)
+        '''
+        dp = cls.__new__(cls)
+        dp._context    = context
+        dp._sorted     = None
+        dp._expression = None
+        dp._ancestor   = None
+        dp._prolongations = {}
+        dp._terms = {k: _Dterm.from_key(k, context.coefficient(c), context)
+                     for k, c in terms.items() if not context.is_zero(c)}
+        dp.normalize()
+        return dp
+
     def ctxfunc(self, e):
         return func(e) and func(e) in self._context._dependent
 
@@ -187,19 +292,19 @@ class _Differential_Polynomial:
         print([x for x in self.derivatives()])
 
     def Lterm(self):
-        return self._p[0].term()
+        return self._lead.term()
 
     def Lder(self):
-        return self._p[0]._d
+        return self._lead._d
+
+    def Lkey(self):
+        return self._lead._key
 
     def Lfunc(self):
-        if is_function(self._p[0]._d):
-            return self._p[0]._d.operator()
-        else:
-            return self._p[0]._d.operator().function()
+        return self._context._dependent[self._lead._key.fidx]
 
     def Lcoeff(self):
-        return self._p[0]._coeff
+        return self._lead._coeff
 
     def terms(self):
         for p in self._p:
@@ -210,31 +315,59 @@ class _Differential_Polynomial:
             yield p._d
 
     def Ldervec(self):
-        # implement asap
-        pass
+        return self._lead._order
 
     def coefficients(self):
         for p in self._p:
             yield p._coeff
 
     def normalize(self):
-        if self._p and self._p[0]._coeff != 1:
-            c = self._p[0]._coeff
-            self._p = [_Dterm((_._coeff / c).simplify() * _._d, self._context)
-                       for _ in self._p]
-        self._expression = sum(_.expression() for _ in self._p)
+        '''finds the leading term and makes it monic, the coefficients are
+        multiplied in place by the exact inverse of the leading one'''
+        rank = self._context.rank
+        self._lead = max(self._terms.values(),
+                         key=lambda item: rank(item._key), default=None)
+        if self._lead is not None and self._lead._coeff != 1:
+            inverse = 1 / self._context.coefficient(self._lead._coeff)
+            for t in self._terms.values():
+                t._coeff = self._context.simplify(t._coeff * inverse)
+                t._expression = None
+        self._sorted     = None
+        self._expression = None
 
     def __nonzero__(self):
-        return len(self._p) > 0
+        return len(self._terms) > 0
 
     def __lt__(self, other):
-        return self._p[0] < other._p[0]
+        return self._lead < other._lead
 
     def __eq__(self, other):
-        return all(eq(_[0]._d, _[1]._d) for _ in zip(self._p, other._p))
+        '''same derivatives with the same coefficients. The polynomials are
+        normalized, so this is the equality of the equations; only symbolic
+        coefficients need maxima.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y))
+        >>> a = _Differential_Polynomial(2*diff(w, x) + 2*x*w, ctx)
+        >>> b = _Differential_Polynomial(diff(w, x) + x*w, ctx)
+        >>> c = _Differential_Polynomial(diff(w, x) + y*w, ctx)
+        >>> a == b, hash(a) == hash(b), a == c, len({a, b, c})
+        (True, True, False, 2)
+        >>> _Differential_Polynomial(0, ctx) == b
+        False
+        '''
+        if self is other:
+            return True
+        if not isinstance(other, _Differential_Polynomial):
+            return NotImplemented
+        if self._terms.keys() != other._terms.keys():
+            return False
+        is_zero = self._context.is_zero
+        return all(is_zero(t._coeff - other._terms[k]._coeff)
+                   for k, t in self._terms.items())
 
     def show(self, rich=True):
-        from IPython.core.debugger import set_trace
         if not rich:
             return str(self)
         res = ""
@@ -252,89 +385,323 @@ class _Differential_Polynomial:
         return res
 
     def diff(self, *args):
-        return type(self)(diff(self.expression(), *args), self._context)
+        '''total derivative by the independent variables in args.
+
+        Works on the terms, as the polynomial is linear: c * D^a f gives
+        c * D^(a + e_i) f + (dc/dx_i) * D^a f. The variables are matched by
+        name, anything else than independent variables of the context goes
+        through Sage's diff.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y))
+        >>> print(_Differential_Polynomial(diff(w, y) + x*y*w, ctx).diff(x, y))
+        diff(w(x, y), x, y, y) + (x*y) * diff(w(x, y), x, y) + (x) * diff(w(x, y), x) + (y) * diff(w(x, y), y) + w(x, y)
+        >>> dp = _Differential_Polynomial(diff(w, y) + x*w, ctx)
+        >>> str(dp.diff(SR.var("x"))) == str(dp.diff(x))
+        True
+        '''
+        context = self._context
+        indices = {str(v): i for i, v in enumerate(context._independent)}
+        names   = [str(_) for _ in args]
+        if not all(_ in indices for _ in names):
+            return type(self)(diff(self.expression(), *args), context)
+        terms = _row(self)
+        for v in names:
+            i, new = indices[v], {}
+            for k, c in terms.items():
+                if k is not None:
+                    _accumulate(new, k.prolong(i), c)
+                _accumulate(new, k, context.differentiate(c, i))
+            terms = new
+        return type(self).from_terms(terms, context)
+
+    def prolong(self, multi_index):
+        '''the derivative by the multi index (the orders of the independent
+        variables), remembered in the polynomial.
+
+        A derivative which isn't known yet is the derivative by a single
+        variable of a lower one, preferably of one which is known already,
+        so a higher derivative only costs the steps which are missing.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y))
+        >>> dp = _Differential_Polynomial(diff(w, y) + x*w, ctx)
+        >>> print(dp.prolong((1, 1)))
+        diff(w(x, y), x, y, y) + (x) * diff(w(x, y), x, y) + diff(w(x, y), y)
+        >>> dp.prolong((1, 1)) is dp.prolong((1, 1)), sorted(dp._prolongations)
+        (True, [(0, 1), (1, 1)])
+        '''
+        alpha = tuple(multi_index)
+        if not any(alpha):
+            return self
+        p = self._prolongations.get(alpha)
+        if p is not None:
+            return p
+        lower = None
+        for i, a in enumerate(alpha):
+            if a:
+                beta = alpha[:i] + (a - 1,) + alpha[i + 1:]
+                if lower is None or beta in self._prolongations:
+                    lower = i, beta
+        i, beta = lower
+        p = self.prolong(beta).diff(self._context._independent[i])
+        self._prolongations[alpha] = p
+        return p
+
+    def forget_prolongations(self):
+        '''drops the remembered derivatives'''
+        self._prolongations = {}
+
+    def __getstate__(self):
+        # the derivatives are computed again where they are needed, instead
+        # of sending them to other processes
+        state = dict(self.__dict__)
+        state["_prolongations"] = {}
+        return state
 
     def __str__(self):
         return " + ".join([str(_) for _ in self._p])
 
     def __hash__(self):
-        return hash(self.expression())
+        # symbolic coefficients have no canonical form, the derivatives do
+        return hash(frozenset(self._terms))
 
 
 # ToDo: Janet_Basis as class as this object has properties like rank, order ...
+def _distinct(S):
+    '''the nonzero elements of S without repetitions, in their order'''
+    return list(dict.fromkeys(_ for _ in S if _._terms))
+
+
 def Reorder(S, context, ascending=False):
-    return sorted(S, key=functools.cmp_to_key(
-        lambda item1, item2:
-            sorter(item1.Lder(), item2.Lder(), context)),
-        reverse=not ascending)
+    return sorted(S, key=lambda item: context.rank(item.Lkey()),
+                  reverse=not ascending)
+
+
+class _ReducerIndex:
+    '''Index from leading derivatives to the elements of a system, one
+    JanetTree per function. Finds a reducer for any derivative with a single
+    lookup instead of trying all elements one after the other.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> z = function("z")(x, y)
+    >>> ctx = Context((w, z), (x, y))
+    >>> S = [_Differential_Polynomial(_, ctx) for _ in
+    ...      [diff(w, y) - w, diff(z, x, x) + z]]
+    >>> index = _ReducerIndex(S, ctx)
+    >>> print(index.reducer(derivative_to_key(diff(w, x, y), ctx)))
+    diff(w(x, y), y) + (-1) * w(x, y)
+    >>> index.reducer(derivative_to_key(diff(z, x, y), ctx)) is None
+    True
+    '''
+    def __init__(self, S, context):
+        self._context = context
+        self._trees   = {}
+        for dp in S:
+            self.insert(dp)
+
+    def insert(self, dp):
+        k = dp.Lkey()
+        if k.fidx not in self._trees:
+            self._trees[k.fidx] = JanetTree(range(len(k.order)))
+        self._trees[k.fidx].insert(k.order, dp)
+
+    def reducer(self, key):
+        '''an element whose leading derivative divides the derivative
+        given by 'key', None if there is none'''
+        if key is None or key.fidx not in self._trees:
+            return None
+        found = self._trees[key.fidx].divisor(key.order)
+        return None if found is None else found[1]
+
+
+def _expand(c):
+    '''cheap normal form of a coefficient during a reduction, symbolic
+    ones are only expanded like the expressions of the polynomials'''
+    return c.expand() if isinstance(c, Expression) else c
+
+
+def _vanishes(c):
+    '''cheap zero test, the exact one is done at the end by from_terms'''
+    return c.is_trivial_zero() if isinstance(c, Expression) else not c
+
+
+def _accumulate(terms, k, c):
+    '''adds c to the coefficient of k in the dict terms'''
+    v = _expand(terms.get(k, 0) + c)
+    if _vanishes(v):
+        terms.pop(k, None)
+    else:
+        terms[k] = v
 
 
 def reduceS(e: _Differential_Polynomial,
-            S: list, context: Context) -> _Differential_Polynomial:
-    reducing = True
-    gen = (_ for _ in S)
-    while reducing:
-        for dp in gen:
-            enew = reduce(e, dp, context)
-            # XXX check wheter we can repalce "==" by 'is'
-            if enew == e:
-                reducing = False
-            else:
-                e = enew
-                gen = (_ for _ in S)
-                reducing = True
-    return enew
+            S, context: Context) -> _Differential_Polynomial:
+    '''reduces e completely with respect to S, which is either a list or a
+    _ReducerIndex (if the same S is used for a lot of reductions).
+
+    Works on the terms {_Dkey: coefficient} of e in a single pass from the
+    highest derivative to the lowest: eliminating a term only changes
+    lower ones, so each derivative is visited once. The polynomial is
+    built again only at the end, e itself is returned if nothing was
+    reducible.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> ctx = Context((w,), (x, y))
+    >>> S = [_Differential_Polynomial(diff(w, y) - w, ctx)]
+    >>> e = _Differential_Polynomial(diff(w, x, y) + x*diff(w, y), ctx)
+    >>> print(reduceS(e, S, ctx))
+    diff(w(x, y), x) + (x) * w(x, y)
+    >>> S = [_Differential_Polynomial(diff(w, x) + diff(w, y) + x*w, ctx)]
+    >>> r = reduceS(_Differential_Polynomial(diff(w, x, y), ctx), S, ctx)
+    >>> print(r); r.Lcoeff().parent()
+    diff(w(x, y), y, y) + (x) * diff(w(x, y), y)
+    Symbolic Ring
+    '''
+    index = S if isinstance(S, _ReducerIndex) else _ReducerIndex(S, context)
+    rank  = context.rank
+    row   = _row(e)
+    heap  = [(tuple(-_ for _ in rank(k)), k) for k in row if k is not None]
+    heapify(heap)
+    seen  = {k for _, k in heap}
+    reduced = False
+    while heap:
+        _, k = heappop(heap)
+        c = row.get(k)
+        if c is None:
+            continue
+        dp = index.reducer(k)
+        if dp is None:
+            continue
+        reduced = True
+        del row[k]
+        p = dp.prolong(k.difference(dp.Lkey()))
+        for t in p._terms.values():
+            if t._key == k:
+                continue
+            v = _expand(row.get(t._key, 0) - c * t._coeff)
+            if _vanishes(v):
+                row.pop(t._key, None)
+                continue
+            row[t._key] = v
+            if t._key is not None and t._key not in seen:
+                seen.add(t._key)
+                heappush(heap, (tuple(-_ for _ in rank(t._key)), t._key))
+    if not reduced:
+        return e
+    return _Differential_Polynomial.from_terms(row, context)
 
 
 def reduce(e1: _Differential_Polynomial,
            e2: _Differential_Polynomial,
            context: Context) -> _Differential_Polynomial:
-    def _order(der):
-        if der != 1:
-            return order_of_derivative(der, len(context._independent))
-        else:
-            return [0]*len(context._independent)
-
-    def _reduce_inner(e1, e2):
-        e2_order = _order(e2.Lder())
-        lf = func(e2.Lder())
-        for t in (_ for _ in e1._p if eq(func(_._d), lf)):
-            c = t._coeff
-            e1_order = _order(t._d)
-            dif = [a-b for a, b in zip(e1_order, e2_order)]
-            if all(map(lambda h: h == 0, dif)):
-                return _Differential_Polynomial(
-                    e1.expression() - e2.expression() * c, context)
-            if all(map(lambda h: h >= 0, dif)):
-                variables_to_diff = []
-                for i in range(len(context._independent)):
-                    if dif[i] != 0:
-                        variables_to_diff.extend([context._independent[i]]*abs(dif[i]))
-                return _Differential_Polynomial(
-                    e1.expression() - c*diff(e2.expression(), *variables_to_diff), 
-                    context)
-        return e1
-    while not bool((_e1 := _reduce_inner(e1, e2)) == e1):
-        e1 = _e1
-    return _e1
+    return reduceS(e1, [e2], context)
+
+
+def _row(dp):
+    '''the terms of dp as a sparse row {_Dkey: coefficient}'''
+    return {k: t._coeff for k, t in dp._terms.items()}
+
+
+def reduce_batch(E, S, context):
+    '''Reduces all polynomials in E with respect to S at once.
+
+    First all prolongations of elements of S needed to reduce any term of
+    E (and of these prolongations) are collected, each of them is computed
+    only once. They form the pivots of one sparse matrix together with the
+    rows of E, which are then brought into reduced row echelon form. The
+    remainders are the same as the ones from reduceS, up to the echelon
+    form between them; zero remainders are dropped.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> ctx = Context((w,), (x, y))
+    >>> S = [_Differential_Polynomial(diff(w, y) - w, ctx)]
+    >>> E = [_Differential_Polynomial(_, ctx) for _ in
+    ...      [diff(w, x, y) + diff(w, y), diff(w, x, y) + diff(w, x) - w]]
+    >>> for _ in reduce_batch(E, S, ctx): print(_)
+    diff(w(x, y), x)
+    w(x, y)
+    '''
+    index  = S if isinstance(S, _ReducerIndex) else _ReducerIndex(S, context)
+    # field elements, so the elimination never divides Python ints
+    rows   = [{k: context.coefficient(c) for k, c in _row(e).items()}
+              for e in E]
+    pivots = {}
+    seen   = set()
+    todo   = [k for r in rows for k in r]
+    while todo:
+        k = todo.pop()
+        if k in seen:
+            continue
+        seen.add(k)
+        dp = index.reducer(k)
+        if dp is None:
+            continue
+        pivots[k] = _row(dp.prolong(k.difference(dp.Lkey())))
+        todo.extend(_ for _ in pivots[k] if _ not in seen)
+    rows = [eliminate(r, pivots, context.rank, context.is_zero,
+                      context.simplify) for r in rows]
+    return [_Differential_Polynomial.from_terms(r, context)
+            for r in echelon(rows, context.rank, context.is_zero,
+                             context.simplify)]
+
 
 def Autoreduce(S, context):
+    '''Reduces each element of S with respect to the elements before it
+    (S is expected in ascending order), until no element can be reduced
+    any more.
+
+    The prefix of already reduced elements grows by one element at a time.
+    All elements after the prefix are irreducible with respect to it
+    except for the element added last, so only those having a term which
+    is a derivative of its leading derivative are reduced again. When a
+    reduced element moves into the prefix, the prefix is cut back to it.
+    Reductions to zero are dropped.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> ctx = Context((w,), (x, y))
+    >>> S = [_Differential_Polynomial(_, ctx) for _ in
+    ...      [diff(w, y) - w, diff(w, x, y) + diff(w, x), diff(w, x, x)]]
+    >>> for _ in Autoreduce(S, ctx): print(_)
+    diff(w(x, y), y) + (-1) * w(x, y)
+    diff(w(x, y), x)
+    '''
     dps = list(S)
+    if len(dps) < 2:
+        return dps
+    index = _ReducerIndex(dps[:1], context)
     i = 0
-    _p, r = dps[:i+1], dps[i+1:]
-    while r:
-        newdps = []
-        have_reduced = False
-        for _r in r:
-            rnew = reduceS(_r, _p, context)
-            have_reduced = have_reduced or rnew != _r
-            newdps.append(rnew)
-        dps = Reorder(_p + [_ for _ in newdps if _ not in _p], context, ascending=True)
-        if not have_reduced:
+    while i + 1 < len(dps):
+        last    = dps[i].Lkey()
+        changed = {}
+        for k in range(i + 1, len(dps)):
+            e = dps[k]
+            if any(t is not None and last.divides(t) for t in e._terms):
+                changed[k] = reduceS(e, index, context)
+        if not changed:
             i += 1
+            index.insert(dps[i])
+            continue
+        moved = {id(_) for _ in changed.values()}
+        dps   = dps[:i + 1] + [changed.get(k, e) for k, e in
+                               enumerate(dps[i + 1:], i + 1)
+                               if k not in changed or changed[k]._terms]
+        dps   = Reorder(dps, context, ascending=True)
+        first = next((k for k, e in enumerate(dps) if id(e) in moved),
+                     len(dps))
+        if first <= i:
+            i = first
+            index = _ReducerIndex(dps[:i + 1], context)
         else:
-            i = 0
-        _p, r = dps[:i+1], dps[i+1:]
+            i += 1
+            if i < len(dps):
+                index.insert(dps[i])
     return dps
 
 
@@ -406,83 +773,90 @@ def vec_multipliers(m, M, Vars):
     ([0], [1, 2])
     >>> vec_multipliers(U[5], U, (2,1,0))
     ([0], [1, 2])
+
+    This builds a JanetTree for M each time, callers which need the
+    multipliers for all elements of M should query a JanetTree directly.
     """
-    d = max((vec_degree(v, u) for u in M for v in Vars), default=0)
-    mult = []
-    if vec_degree(Vars[0], m) == d:
-        mult.append(Vars[0])
-    for j in range(1, len(Vars)):
-        v = Vars[j]
-        dd = list(map(lambda x: vec_degree(x, m), Vars[:j]))
-        V = []
-        for _u in M:
-            if [vec_degree(_v, _u) for _v in Vars[:j]] == dd:
-                V.append(_u)
-        if vec_degree(v, m) == max((vec_degree(v, _u) for _u in V), default=0):
-            mult.append(v)
-    return mult, list(sorted(set(Vars) - set(mult)))
-
-
-@functools.cache
+    return JanetTree(Vars, M).multipliers(m)
+
+
+@cached("derivative_to_vec", maxsize=2**14, scope=1, max_scopes=16)
 def derivative_to_vec(d, context):
-    return order_of_derivative(d, len(context._independent))
+    return list(derivative_to_key(d, context).order)
+
+
+def _origin(dp):
+    '''(root, alpha): dp is exactly the derivative of order alpha of the
+    element root, alpha is None if dp is its own root'''
+    return dp._ancestor or (dp, None)
+
+
+def _prolonged_origin(dp, n):
+    '''the origin of dp differentiated by the variable with index n'''
+    root, alpha = _origin(dp)
+    alpha = list(alpha or [0]*len(dp.Lkey().order))
+    alpha[n] += 1
+    return root, tuple(alpha)
 
 
 def complete(S, context):
+    '''Janet completion of S in the style of Gerdt's algorithm.
+
+    The nonmultiplicative prolongations wait in a queue ordered by the
+    ranking, the lowest one without a Janet divisor is added next. Each
+    element queues its prolongation by a nonmultiplier once, after an
+    insertion only the new nonmultipliers are queued. As an insertion can
+    take away the Janet divisor of a prolongation which was dropped
+    before, a final pass checks all of them again.
+    '''
     result = list(S)
     if len(result) == 1:
         return result
-    vars = list(range(len(context._independent)))
-
-    def map_old_to_new(v):
-        return context._independent[vars.index(v)]
-    while 1:
-        monomials = [(_, derivative_to_vec(_.Lder(), context)) for _ in result]
-        ms        = tuple([_[1] for _ in monomials])
-        m0 = []
-
-        # multiplier-collection is our M
-        multiplier_collection = []
-        for dp, monom in monomials:
-            # S1
-            _multipliers, _nonmultipliers = vec_multipliers(monom, ms, vars)
-            multiplier_collection.append((monom, dp, _multipliers, _nonmultipliers))
-        for monom, dp, _multipliers, _nonmultipliers in multiplier_collection:
-            if not _nonmultipliers:
-                m0.append((monom, None, dp))
-            else:
-                # todo: do we need subsets or is a multiplication by only one
-                # nonmultiplier one after the other enough ?
-                for n in _nonmultipliers:
-                    _m0 = list(monom)
-                    _m0[n] += 1
-                    m0.append((_m0, n, dp))
-        to_remove = []
-        for _m0 in m0:
-            # S3: check whether in class of any of the monomials
-            for monomial, _, _multipliers, _nonmultipliers in multiplier_collection:
-                if all(_m0[0][x] >= monomial[x] for x in _multipliers) and \
-                   all(_m0[0][x] == monomial[x] for x in _nonmultipliers):
-                    # this is in _m0's class
-                    to_remove.append(_m0)
-        for _to in to_remove:
-            try:
-                m0.remove(_to)
-            except:
-                pass
-        if not m0:
-            return result
-        else:
-            for _m0 in m0:
-                dp = _Differential_Polynomial(_m0[2].diff(map_old_to_new(_m0[1])).expression(), context)
-                if dp not in result:
-                    result.append(dp)
-        result = Reorder(result, context, ascending=False)
+    tree = JanetTree(list(range(len(context._independent))))
+    for dp in result:
+        tree.insert(dp.Lkey().order, dp)
+    queue  = []
+    queued = {}
+    order  = count()
+
+    def enqueue(dp, n):
+        heappush(queue, (context.rank(dp.Lkey().prolong(n)), next(order),
+                         dp, n))
+
+    def enqueue_new():
+        for dp in result:
+            done = queued.setdefault(id(dp), set())
+            for n in tree.multipliers(dp.Lkey().order)[1]:
+                if n not in done:
+                    done.add(n)
+                    enqueue(dp, n)
+
+    enqueue_new()
+    while queue:
+        while queue:
+            _, _, parent, n = heappop(queue)
+            key = parent.Lkey().prolong(n)
+            if tree.janet_divisor(key.order) is not None:
+                continue
+            dp = parent.prolong(key.difference(parent.Lkey()))
+            dp._ancestor = _prolonged_origin(parent, n)
+            result.append(dp)
+            tree.insert(key.order, dp)
+            enqueue_new()
+        for dp in result:
+            for n in tree.multipliers(dp.Lkey().order)[1]:
+                if tree.janet_divisor(dp.Lkey().prolong(n).order) is None:
+                    enqueue(dp, n)
+    return result
 
 
-def CompleteSystem(S, context):
+def CompleteSystem(S, context, map=map):
     """
-    Algorithm C1, p. 385
+    Algorithm C1, p. 385 (the completion is the one of Gerdt's algorithm,
+    see 'complete', which can be smaller than the one of the book)
+
+    The functions are completed independently of each other, 'map' (e.g.
+    the one of an executor) is used to run them.
 
     >>> tvars=var("x y z")
     >>> w = function("w")(*tvars)
@@ -500,17 +874,11 @@ def CompleteSystem(S, context):
     diff(w(x, y, z), x, y, z)
     diff(w(x, y, z), x, x, y)
     diff(w(x, y, z), x, y, z, z)
-    diff(w(x, y, z), x, x, y, z)
     diff(w(x, y, z), x, x, x, y)
     diff(w(x, y, z), x, y, z, z, z)
-    diff(w(x, y, z), x, x, y, z, z)
-    diff(w(x, y, z), x, x, x, y, z)
     diff(w(x, y, z), x, x, x, y, y)
-    diff(w(x, y, z), x, x, y, z, z, z)
     diff(w(x, y, z), x, x, x, z, z, z)
-    diff(w(x, y, z), x, x, x, y, z, z)
     diff(w(x, y, z), x, x, x, y, y, z)
-    diff(w(x, y, z), x, x, x, y, z, z, z)
     diff(w(x, y, z), x, x, x, y, y, z, z)
     >>> # example from Schwarz, pp 54
     >>> w = function("w")(x,y)
@@ -528,61 +896,275 @@ def CompleteSystem(S, context):
     diff(z(x, y), x, x, x) + (1/y) * diff(w(x, y), x, x) + (8*y^2) * diff(w(x, y), y, y) + (-4*y^2) * diff(z(x, y), x, y) + (-32*y) * diff(z(x, y), x) + (-16) * w(x, y)
     """
     s = bucket(S, key=lambda d: d.Lfunc())
-    res = flatten([complete(s[k], context) for k in s])
+    res = flatten(map(complete, [list(s[k]) for k in s], repeat(context)))
     return Reorder(res, context, ascending=True)
 
 
-def split_by_function(S, context):
+def split_by_function(S, context, history=None, pairs=None):
     s = bucket(S, key=lambda d: d.Lfunc())
-    return flatten([FindIntegrableConditions(s[k], context) for k in s])
+    if history is not None:
+        history.start(S)
+    return flatten([FindIntegrableConditions(s[k], context, history, pairs)
+                    for k in s])
+
+
+def _integrability_pairs(S, context):
+    '''Yields (e1, n, e2, m) for the nonmultiplicative prolongations of
+    the elements of S: e1 differentiated by its nonmultiplier n has the
+    same leading derivative as its Janet divisor e2 differentiated by the
+    multipliers m (indices of the variables, repeated by the order).
+
+    Each prolongation has at most one Janet divisor, so it is checked once;
+    there is none if S is not complete.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> ctx = Context((w,), (x, y))
+    >>> S = [_Differential_Polynomial(_, ctx) for _ in
+    ...      [diff(w, y) - w, diff(w, x) - w]]
+    >>> [(str(e1.Lder()), n, str(e2.Lder()), m)
+    ...  for e1, n, e2, m in _integrability_pairs(S, ctx)]
+    [('diff(w(x, y), y)', 0, 'diff(w(x, y), x)', (1,))]
+    '''
+    if len(S) == 1:
+        return
+    vars = list(range(len(context._independent)))
+    tree = JanetTree(vars)
+    for dp in S:
+        tree.insert(dp.Lkey().order, dp)
+    for e1 in S:
+        _, _nonmultipliers = tree.multipliers(e1.Lkey().order)
+        for n in _nonmultipliers:
+            l1 = e1.Lkey().prolong(n)
+            found = tree.janet_divisor(l1.order)
+            if found is None:
+                continue
+            e2 = found[1]
+            m  = tuple(v for v, k in enumerate(l1.difference(e2.Lkey()))
+                       for _ in range(k))
+            yield e1, n, e2, m
+
+
+def _integrability_condition(e1, n, e2, m, context):
+    '''e1 differentiated by the variable with index n minus e2
+    differentiated by the variables with the indices in m, both from the
+    prolongations remembered in e1 and e2'''
+    # don't need leading coefficients because in DPs
+    # it is always 1
+    alpha = [0]*len(context._independent)
+    alpha[n] += 1
+    beta = [0]*len(context._independent)
+    for _ in m:
+        beta[_] += 1
+    terms = _row(e1.prolong(alpha))
+    for t in e2.prolong(beta)._terms.values():
+        _accumulate(terms, t._key, -t._coeff)
+    return _Differential_Polynomial.from_terms(terms, context)
+
+
+def _forget_prolongations(old, new):
+    '''drops the prolongations remembered in the elements of old which
+    are not in new any more'''
+    keep = set(map(id, new))
+    for dp in old:
+        if id(dp) not in keep:
+            dp.forget_prolongations()
+
+
+def _same_origin(e1, e2):
+    '''ancestor criterion: e1 and e2 are both derivatives of the same
+    element, so their prolongations to the same leading derivative are
+    equal'''
+    return _origin(e1)[0] is _origin(e2)[0]
+
+
+def FindIntegrableConditions(S, context, history=None, pairs=None):
+    '''Computes the integrability conditions of S.
+
+    A condition is e1 differentiated by the nonmultiplier n minus its
+    Janet divisor e2 differentiated by the multipliers m, see
+    _integrability_pairs. Conditions which are known to reduce to zero are
+    dropped before anything symbolic is done:
+        * e1 and e2 are prolongations of the same element (see complete)
+        * they reduced to zero before and the part of the system they
+          depend on is unchanged, see _History
+
+    The pairs (e1, n, e2, m) of the remaining conditions are appended to
+    'pairs' if given. The conditions are computed from the prolongations
+    remembered in the elements (see _Differential_Polynomial.prolong), which
+    are shared with 'complete' and the reductions.
+    '''
+    todo = [_ for _ in _integrability_pairs(list(S), context)
+            if not (_same_origin(_[0], _[2]) or
+                    (history is not None and history.known(*_)))]
+    if pairs is not None:
+        pairs.extend(todo)
+    return [_integrability_condition(e1, n, e2, m, context)
+            for e1, n, e2, m in todo]
+
+
+class _History:
+    '''Integrability conditions which reduced to zero.
+
+    The reduction of a condition only uses the elements whose leading
+    derivatives are not higher than the one of the condition, so as long as
+    these are the same (identical objects) the condition reduces to zero
+    again and isn't computed. The history keeps them alive, so their ids
+    stay valid.
+    '''
+    def __init__(self, context):
+        self._context = context
+        self._zero    = {}
+        self.skipped  = 0
+
+    def start(self, S):
+        '''sets the system of a new round'''
+        rank = self._context.rank
+        self._S     = sorted(S, key=lambda dp: rank(dp.Lkey()))
+        self._ranks = [rank(dp.Lkey()) for dp in self._S]
+        self.skipped = 0
+        alive = set(map(id, S))
+        self._zero = {k: v for k, v in self._zero.items()
+                      if k[0] in alive and k[2] in alive}
+
+    def _below(self, e1, n):
+        rank = self._context.rank(e1.Lkey().prolong(n))
+        return self._S[:bisect_right(self._ranks, rank)]
+
+    def known(self, e1, n, e2, m):
+        below = self._zero.get((id(e1), n, id(e2), m))
+        if below is None:
+            return False
+        now = self._below(e1, n)
+        if len(now) != len(below) or \
+           any(a is not b for a, b in zip(now, below)):
+            return False
+        self.skipped += 1
+        return True
+
+    def add(self, e1, n, e2, m):
+        '''the condition of the pair reduced to zero in this round'''
+        self._zero[(id(e1), n, id(e2), m)] = self._below(e1, n)
+
+
+def _reduce_conditions(conditions, S, context):
+    '''reduceS for a chunk of conditions, runs in the worker processes'''
+    index = _ReducerIndex(S, context)
+    return [reduceS(_m, index, context) for _m in conditions]
+
+
+def _constant_rows(S, context):
+    '''The elements of S as sparse rows {_Dkey: rational number}, None if
+    any coefficient is not a rational number'''
+    rows = []
+    for dp in S:
+        row = {}
+        for t in dp._terms.values():
+            if t._key is None:
+                return None
+            try:
+                row[t._key] = QQ(t._coeff)
+            except (TypeError, ValueError):
+                return None
+        rows.append(row)
+    return rows
 
 
-def FindIntegrableConditions(S, context):
-    result = list(S)
-    if len(result) == 1:
-        return []
-    vars = list(range(len(context._independent)))
-    monomials = [(_, derivative_to_vec(_.Lder(), context)) for _ in result]
-
-    ms = tuple([_[1] for _ in monomials])
-
-    def map_old_to_new(i):
-        return context._independent[vars.index(i)]
-
-    # multiplier-collection is our M
-    multiplier_collection = []
-    for dp, monom in monomials:
-        # S1
-        # damned! Variables are messed up!
-        _multipliers, _nonmultipliers = vec_multipliers(monom, ms, vars)
-        multiplier_collection.append(
-            (dp,
-             [map_old_to_new(_) for _ in _multipliers],
-             [map_old_to_new(_) for _ in _nonmultipliers]
-             ))
-    result = []
-    for e1, e2 in product(multiplier_collection, repeat=2):
-        if e1 == e2: continue
-        for n in e1[2]:
-            for m in islice(powerset(e2[1]), 1, None):
-                if eq(adiff(e1[0].Lder(), context, n), adiff(e2[0].Lder(), context, *m)):
-                    # integrability condition
-                    # don't need leading coefficients because in DPs
-                    # it is always 1
-                    c = adiff(e1[0].expression(), context, n) - \
-                        adiff(e2[0].expression(), context, *m)
-                    result.append(c)
-    return result
+def _canonical(S, context):
+    '''canonical, JSON serializable form of a system of normalized
+    _Differential_Polynomials in a context, used for the fingerprint'''
+    equations = {json.dumps(_dump(dp, context)) for dp in S if dp._terms}
+    return {"equations": sorted(equations),
+            "dependent": [str(_) for _ in context._dependent],
+            "independent": [str(_) for _ in context._independent],
+            "ranking": context._rows,
+            "rational": context._rational}
+
+
+def _dump(dp, context):
+    return [[[t._key.fidx, list(t._key.order)],
+             str(context.symbolic(t._coeff))] for t in dp._p]
+
+
+def _load(terms, context):
+    return _Differential_Polynomial.from_terms(
+        {_Dkey(fidx, order): SR(c) for (fidx, order), c in terms}, context)
+
+
+Step = namedtuple("Step", ["iteration", "phase", "size", "conditions",
+                           "time", "elapsed", "S"])
+Step.__doc__ = '''state of a Janet basis computation after a phase of an
+iteration: size of the system, number of integrability conditions of the
+iteration, wall time of the phase and since the start, and a copy of the
+system'''
+
+
+class Interrupted(RuntimeError):
+    '''raised by Janet_Basis.steps if a budget is exhausted or the
+    computation is cancelled, 'reason' is one of "time", "iterations",
+    "size" and "cancelled"'''
+    def __init__(self, reason):
+        super().__init__("Janet basis computation stopped: %s" % reason)
+        self.reason = reason
+
+
+class _Budget:
+    def __init__(self, max_time=None, max_iterations=None, max_size=None,
+                 cancel=None, clock=time.perf_counter):
+        self.max_time, self.max_iterations = max_time, max_iterations
+        self.max_size, self.cancel, self.clock = max_size, cancel, clock
+        self.start = clock()
+
+    def exceeded(self, iteration, size):
+        '''the reason to stop, None if there is none
+
+        >>> b = _Budget(max_iterations=2, max_size=10, cancel=lambda: False)
+        >>> b.exceeded(2, 10), b.exceeded(3, 10), b.exceeded(1, 11)
+        (None, 'iterations', 'size')
+        '''
+        if self.cancel is not None and \
+           getattr(self.cancel, "is_set", self.cancel)():
+            return "cancelled"
+        if self.max_time is not None and \
+           self.clock() - self.start > self.max_time:
+            return "time"
+        if self.max_iterations is not None and \
+           iteration > self.max_iterations:
+            return "iterations"
+        if self.max_size is not None and size > self.max_size:
+            return "size"
+        return None
 
 
 class Janet_Basis:
-    def __init__(self, S, dependent, independent, sort_order=Mgrevlex):
+    def __init__(self, S, dependent, independent, sort_order=Mgrevlex,
+                 rational=False, batch=False, stats=False, executor=None,
+                 jobs=None, cache=None, lazy=False):
         """
         Parameters:
             * List of homogenous PDE's
             * List of dependent variables, i.e. the functions to searched for
             * List of variables
             * sort order, default is grevlex
+            * rational: keep coefficients in the field of rational functions
+              of the variables where possible (exact arithmetic, canonical
+              forms, cheap zero tests) instead of the symbolic ring
+            * batch: reduce the integrability conditions of each round
+              together in one sparse matrix, see 'reduce_batch'
+            * stats: record wall time, calls and 'eq' comparisons of the
+              phases of each iteration in 'self.stats', see Statistics.Stats
+            * executor, jobs: run the completion of the functions and the
+              reduction of the integrability conditions on 'executor' (e.g.
+              a ProcessPoolExecutor) or on a process pool with 'jobs'
+              workers which lives as long as the computation. The order of
+              the results doesn't depend on it. With an executor, 'jobs' is
+              the number of its workers (default: the number of CPUs).
+            * cache: a directory (or a DiskCache) where the basis is stored
+              under a fingerprint of the normalized input, the context and
+              the library version. Later calls with the same system load it
+              from there.
+            * lazy: don't compute anything yet, the computation runs while
+              iterating over 'steps', which can limit it
 
         >>> vars = var ("x y")
         >>> z = function("z")(*vars)
@@ -642,50 +1224,387 @@ class Janet_Basis:
         diff(z(x, y), x) + (1/2/y) * w(x, y)
         diff(w(x, y), y) + (-1/y) * w(x, y)
         diff(w(x, y), x)
+        >>> checkS=Janet_Basis(system_2_24, (w,z), vars, rational=True)
+        >>> checkS.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
+        >>> checkS=Janet_Basis(system_2_25, (w,z), vars, batch=True)
+        >>> checkS.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
+        >>> checkS=Janet_Basis(system_2_25, (w,z), vars, stats=True)
+        >>> sorted(checkS.stats.summary())
+        ['Autoreduce', 'CompleteSystem', 'reduceS', 'split_by_function']
+        >>> checkS.stats.summary()["Autoreduce"]["calls"] == checkS.stats.iteration
+        True
+        >>> checkS=Janet_Basis(system_2_25, (w,z), vars, jobs=2)
+        >>> checkS.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
+        >>> import tempfile
+        >>> cache = DiskCache(tempfile.mkdtemp())
+        >>> checkS=Janet_Basis(system_2_25, (w,z), vars, cache=cache)
+        >>> len(cache)
+        1
+        >>> checkS=Janet_Basis(system_2_25[::-1], (w,z), vars, cache=cache)
+        >>> checkS.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
         """
-        eq.cache_clear()
-        context = Context(dependent, independent, sort_order)
+        context = Context(dependent, independent, sort_order, rational)
+        self._context = context
+        self._batch   = batch
+        self.stats    = Stats() if stats else None
+        self._executor, self._jobs = executor, jobs
+        self.conditions = []
+        self.done       = False
+        self._iteration = 0
+        self._budget    = None
+        self._history   = _History(context)
         if not isinstance(S, Iterable):
             # bad criterion
             self.S = [S]
         else:
             self.S = S[:]
-        old = []
-        self.S = Reorder([_Differential_Polynomial(s, context) for s in self.S], context, ascending = True)
+        self.S = Reorder(_distinct(_Differential_Polynomial(s, context)
+                                   for s in self.S),
+                         context, ascending=True)
+        if cache is not None and not isinstance(cache, DiskCache):
+            cache = DiskCache(cache)
+        self._computation = self._compute(cache)
+        if not lazy:
+            for _ in self._computation:
+                pass
+            self._computation = None
+
+    def __getstate__(self):
+        # the running computation, its budget and the executor stay here,
+        # a copy can't continue an unfinished computation
+        state = dict(self.__dict__)
+        state.update(_computation=None, _budget=None, _executor=None)
+        return state
+
+    def steps(self, max_time=None, max_iterations=None, max_size=None,
+              cancel=None):
+        """Runs the computation of a Janet_Basis created with 'lazy=True'
+        and yields a Step after each phase (Autoreduce, CompleteSystem,
+        conditions, reduce) of each iteration.
+
+        Parameters:
+            * max_time: wall time in seconds
+            * max_iterations: number of iterations
+            * max_size: number of elements of the intermediate system
+            * cancel: a threading/multiprocessing Event or a function, the
+              computation stops as soon as it is set or returns True
+
+        Budgets and cancellation are checked between the phases (and
+        between the reductions of single conditions), then Interrupted is
+        raised and 'self.S' is the system of the last step. An interrupted
+        computation can't be continued. After a complete run 'self.done' is
+        True, the basis can be pickled then.
+
+        >>> vars = var ("x y")
+        >>> z = function("z")(*vars)
+        >>> w = function("w")(*vars)
+        >>> g1 = diff(z, y,y) + diff(z,y)/(2*y)
+        >>> g2 = diff(w,x,x) + 4*diff(w,y)*y**2 - 8*(y**2) * diff(z,x) - 8*w*y
+        >>> g3 = diff(w,x,y) - diff(z,x,x)/2 - diff(w,x)/(2*y) - 6* (y**2) * diff(z,y)
+        >>> g4 = diff(w,y,y) - 2*diff(z,x,y) - diff(w,y)/(2*y) + w/(2*y**2)
+        >>> jb = Janet_Basis([g2,g3,g4,g1], (w,z), vars, lazy=True)
+        >>> [_.phase for _ in jb.steps()][:4]
+        ['Autoreduce', 'CompleteSystem', 'conditions', 'reduce']
+        >>> jb.done, len(jb.S)
+        (True, 4)
+        >>> import pickle
+        >>> copy = pickle.loads(pickle.dumps(jb))
+        >>> copy.done, [str(_) for _ in copy.S] == [str(_) for _ in jb.S]
+        (True, True)
+        >>> jb = Janet_Basis([g2,g3,g4,g1], (w,z), vars, lazy=True)
+        >>> try:
+        ...     for step in jb.steps(max_iterations=1):
+        ...         pass
+        ... except Interrupted as e:
+        ...     print(e.reason, step.iteration, jb.done)
+        iterations 1 False
+        >>> import threading
+        >>> stop = threading.Event(); stop.set()
+        >>> jb = Janet_Basis([g2,g3,g4,g1], (w,z), vars, lazy=True)
+        >>> try:
+        ...     list(jb.steps(cancel=stop))
+        ... except Interrupted as e:
+        ...     print(e)
+        Janet basis computation stopped: cancelled
+        """
+        if self._computation is None:
+            return
+        self._budget = _Budget(max_time, max_iterations, max_size, cancel)
+        try:
+            yield from self._computation
+        except Interrupted:
+            self._computation.close()
+            self._computation = None
+            raise
+        finally:
+            self._budget = None
+        self._computation = None
+
+    def _checkpoint(self, size=None):
+        if self._budget is not None:
+            reason = self._budget.exceeded(self._iteration,
+                                           len(self.S) if size is None
+                                           else size)
+            if reason:
+                raise Interrupted(reason)
+
+    def _step(self, phase, started):
+        now = time.perf_counter()
+        return Step(self._iteration, phase, len(self.S),
+                    len(self.conditions), now - started,
+                    now - self._started, self.S[:])
+
+    def _compute(self, cache):
+        context = self._context
+        self._started = time.perf_counter()
+        if cache is not None:
+            key = fingerprint(_canonical(self.S, context))
+            stored = cache.get(key)
+            if stored is not None:
+                self.S = [_load(_, context) for _ in stored]
+                self.done = True
+                yield self._step("cache", self._started)
+                return
+        rows = _constant_rows(self.S, context)
+        if rows is not None:
+            yield from self._run_constant(rows)
+        else:
+            yield from self._run()
+        if cache is not None:
+            cache.put(key, [_dump(_, context) for _ in self.S])
+        self.done = True
+
+    def _run_constant(self, rows):
+        """Janet basis for constant coefficients.
+
+        Differentiation is only a shift of the derivatives then, so the
+        autoreduced basis is computed by sparse rational row operations, see
+        SparseLinearAlgebra.constant_janet_basis. The completion and the
+        ordering are the same as the ones of '_run'. It counts as one
+        iteration, the budget of 'steps' is also checked between the rows
+        of the elimination.
+
+        >>> vars = var ("x y")
+        >>> w = function("w")(*vars)
+        >>> jb = Janet_Basis([diff(w, x, x) - diff(w, y), diff(w, x, y) - w],
+        ...                  (w,), vars)
+        >>> jb.show()
+        diff(w(x, y), y, y) + (-1) * diff(w(x, y), x)
+        diff(w(x, y), x, y) + (-1) * w(x, y)
+        diff(w(x, y), x, x) + (-1) * diff(w(x, y), y)
+        >>> jb = Janet_Basis([diff(w, x, x) - diff(w, y), diff(w, x, y) - w],
+        ...                  (w,), vars, lazy=True)
+        >>> try:
+        ...     list(jb.steps(max_size=2))
+        ... except Interrupted as e:
+        ...     print(e.reason, jb._iteration, jb.done)
+        size 1 False
+        """
+        context = self._context
+        self._iteration += 1
+        self._checkpoint()
+        if self.stats is not None:
+            self.stats.next_iteration()
+        started = time.perf_counter()
+        with self._phase("constant_janet_basis"):
+            basis = constant_janet_basis(rows, len(context._independent),
+                                         context.rank, context.is_zero,
+                                         self._checkpoint)
+        self.S = [_Differential_Polynomial.from_terms(_, context)
+                  for _ in basis]
+        yield self._step("constant_janet_basis", started)
+        self._checkpoint()
+        started = time.perf_counter()
+        with self._phase("CompleteSystem"):
+            self.S = CompleteSystem(self.S, context)
+        yield self._step("CompleteSystem", started)
+        self._checkpoint()
+        started = time.perf_counter()
+        # the basis is involutive, all conditions reduce to zero
+        with self._phase("split_by_function"):
+            self.conditions = list(split_by_function(self.S, context))
+        # '_run' returns its last round in descending order when there are
+        # no conditions, otherwise the round after, in ascending order
+        self.S = Reorder(self.S, context, ascending=bool(self.conditions))
+        yield self._step("conditions", started)
+
+    def _phase(self, name):
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.phase(name)
+
+    @contextmanager
+    def _pool(self):
+        '''yields (map, number of workers) of the executor to use'''
+        if self._executor is not None:
+            yield self._executor.map, self._jobs or os.cpu_count()
+        elif self._jobs is not None and self._jobs > 1:
+            with ProcessPoolExecutor(self._jobs) as pool:
+                yield pool.map, self._jobs
+        else:
+            yield map, 1
+
+    def _run(self):
+        with self._pool() as (pmap, workers):
+            yield from self._run_loop(pmap, workers)
+
+    def _reduce_conditions(self, index, pmap, workers):
+        context = self._context
+        if workers == 1:
+            reduced = []
+            for _m in self.conditions:
+                self._checkpoint()
+                with self._phase("reduceS"):
+                    reduced.append(reduceS(_m, index, context))
+            return reduced
+        # contiguous chunks, one per worker, keep the order
+        size = -(-len(self.conditions) // workers)
+        chunks = [self.conditions[i:i + size]
+                  for i in range(0, len(self.conditions), size)]
+        with self._phase("reduceS"):
+            return list(flatten(pmap(_reduce_conditions, chunks,
+                                     repeat(self.S), repeat(context))))
+
+    def _run_loop(self, pmap, workers):
+        """The completion loop.
+
+        The integrability conditions which reduced to zero are remembered
+        in 'self._history' (see _History), also for later calls of 'add'.
+        Elements coming back from other processes are copies, so nothing is
+        skipped then.
+        """
+        context  = self._context
+        history  = self._history
+        old      = []
         while 1:
             if old == self.S:
                 # no change since last run
-                return
+                break
             old = self.S[:]
+            self._iteration += 1
+            self._checkpoint()
+            if self.stats is not None:
+                self.stats.next_iteration()
+            started = time.perf_counter()
  #           print("This is where we start")
  #           self.show()
 #            for _ in self.S:
 #                _.Lder().show()
             #set_trace()
-            self.S = Autoreduce(self.S, context)
+            with self._phase("Autoreduce"):
+                self.S = Autoreduce(self.S, context)
+            _forget_prolongations(old, self.S)
  #           print("after autoreduce")
  #           self.show()
  #           for _ in self.S:
  #               _.Lder().show()
-
-            self.S = CompleteSystem(self.S, context)
+            yield self._step("Autoreduce", started)
+            self._checkpoint()
+            started = time.perf_counter()
+            before = self.S
+            with self._phase("CompleteSystem"):
+                self.S = CompleteSystem(self.S, context, pmap)
+            # copies if the completion ran in other processes
+            _forget_prolongations(before, self.S)
 #            print("after complete system")
 #            self.show()
-
-            self.conditions = split_by_function(self.S, context)
-            reduced = [reduceS(_Differential_Polynomial(_m, context), self.S, context)
-                       for _m in self.conditions
-                       ]
-            if not reduced:
+            yield self._step("CompleteSystem", started)
+            self._checkpoint()
+            started = time.perf_counter()
+            pairs = []
+            with self._phase("split_by_function"):
+                self.conditions = list(split_by_function(self.S, context,
+                                                         history, pairs))
+            yield self._step("conditions", started)
+            self._checkpoint()
+            started = time.perf_counter()
+            index = _ReducerIndex(self.S, context)
+            if self._batch:
+                with self._phase("reduce_batch"):
+                    reduced = reduce_batch(self.conditions, index, context)
+            else:
+                reduced = self._reduce_conditions(index, pmap, workers)
+            if self._batch:
+                # the echelon form doesn't tell which condition is which
+                if not reduced:
+                    for _ in pairs:
+                        history.add(*_)
+            else:
+                for _, r in zip(pairs, reduced):
+                    if not r._terms:
+                        history.add(*_)
+            if not self.conditions and not history.skipped:
                 self.S = Reorder(self.S, context)
-                return
-            self.S += [_ for _ in reduced if
-                       not (_ in self.S or eq(_.expression(), 0))]
+                yield self._step("reduce", started)
+                break
+            self.S = _distinct(self.S + reduced)
             self.S = Reorder(self.S, context, ascending=True)
+            yield self._step("reduce", started)
+
+    def add(self, S):
+        """Adds equations to an already computed Janet basis.
+
+        Equations which reduce to zero with respect to the basis are dropped
+        right away. Otherwise the completion continues from the current
+        basis instead of starting from scratch, and the integrability
+        conditions which were already checked are not computed again as
+        long as the elements they depend on survive the autoreduction.
+
+        >>> vars = var ("x y")
+        >>> z = function("z")(*vars)
+        >>> w = function("w")(*vars)
+        >>> jb = Janet_Basis([diff(z, y), diff(z, x) + w/(2*y),
+        ...                   diff(w, y) - w/y, diff(w, x)], (w, z), vars)
+        >>> jb.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
+        >>> jb.add([diff(z, x, y)])
+        >>> jb.show()
+        diff(z(x, y), y)
+        diff(z(x, y), x) + (1/2/y) * w(x, y)
+        diff(w(x, y), y) + (-1/y) * w(x, y)
+        diff(w(x, y), x)
+        >>> jb.add([w])
+        >>> jb.show()
+        w(x, y)
+        diff(z(x, y), y)
+        diff(z(x, y), x)
+        """
+        context = self._context
+        if not isinstance(S, Iterable):
+            S = [S]
+        index = _ReducerIndex(self.S, context)
+        new = [reduceS(_Differential_Polynomial(s, context), index, context)
+               for s in S]
+        new = _distinct(new)
+        if not new:
+            return
+        self.S = Reorder(self.S + new, context, ascending=True)
+        for _ in self._run():
+            pass
 
     def show(self, rich=False):
         """Print the Janet basis with leading derivative first."""
-        from IPython.display import Math
+        if rich:
+            from IPython.display import Math, display
         for _ in self.S:
             if rich:
                 display(Math(_.show()))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Janet trees as described in V.P. Gerdt, Yu.A. Blinkov, 'Janet-like monomial
+division' and V.P. Gerdt, 'Involutive Algorithms for Computing Groebner
+Bases' (see some_papers/).
+
+A Janet tree stores a set of monomials (here: the order vectors of leading
+derivatives) level by level, one level per variable. On each level the
+monomials are grouped by their degree in that variable, so the Janet
+multiplicative variables can be read off while walking down the path of a
+monomial instead of rescanning the whole set for every variable.
+"""
+
+
+class _JanetNode:
+    '''one level of the tree: maps the degree of the variable of this level
+    to the next level (or to the list of payloads on the last level)'''
+    __slots__ = ("children", "max")
+
+    def __init__(self):
+        self.children = {}
+        self.max      = None
+
+
+class JanetTree:
+    """Janet tree for a set of monomials.
+
+    vars: a tuple representing the order of indices in the monomials, the
+          same as for 'vec_multipliers':
+              (0,1,2) means first index in m represents the highest variable
+              (2,1,0) means last index in m represents the highest variable
+
+    Each monomial can carry payloads (e.g. the differential polynomial it is
+    the leading derivative of), monomials may be inserted more than once.
+
+    The example is from Gerdt/Blinkov: Janet-like monomial division, Table 1
+
+    >>> U = [(0,0,5), (1,2,2), (2,0,2), (1,4,0), (2,1,0), (5,0,0)]
+    >>> t = JanetTree((2,1,0), U)
+    >>> len(t)
+    6
+    >>> for u in U: print(u, t.multipliers(u))
+    (0, 0, 5) ([2, 1, 0], [])
+    (1, 2, 2) ([1, 0], [2])
+    (2, 0, 2) ([0], [1, 2])
+    (1, 4, 0) ([1, 0], [2])
+    (2, 1, 0) ([0], [1, 2])
+    (5, 0, 0) ([0], [1, 2])
+    >>> t.delete((1,4,0))
+    >>> t.multipliers((2,1,0))
+    ([1, 0], [2])
+    >>> (1,4,0) in t, (2,1,0) in t
+    (False, True)
+    """
+    def __init__(self, vars, monomials=()):
+        self._vars = tuple(vars)
+        self._root = _JanetNode()
+        self._size = 0
+        for m in monomials:
+            self.insert(m)
+
+    def __len__(self):
+        return self._size
+
+    def _leaf(self, m):
+        node = self._root
+        for v in self._vars:
+            node = node.children.get(m[v]) if node is not None else None
+            if node is None:
+                return None
+        return node
+
+    def __contains__(self, m):
+        return bool(self._leaf(m))
+
+    def __iter__(self):
+        '''yields (monomial, payload) for all entries'''
+        def walk(node, level, path):
+            for d, child in node.children.items():
+                path[self._vars[level]] = d
+                if level == len(self._vars) - 1:
+                    for p in child:
+                        yield tuple(path), p
+                else:
+                    yield from walk(child, level + 1, path)
+        yield from walk(self._root, 0, [0]*len(self._vars))
+
+    def insert(self, m, payload=None):
+        '''adds the monomial m, multipliers of the other monomials are
+        updated on the fly'''
+        node = self._root
+        last = len(self._vars) - 1
+        for level, v in enumerate(self._vars):
+            d = m[v]
+            child = node.children.get(d)
+            if child is None:
+                child = [] if level == last else _JanetNode()
+                node.children[d] = child
+                if node.max is None or d > node.max:
+                    node.max = d
+            node = child
+        node.append(payload)
+        self._size += 1
+
+    def delete(self, m, payload=None):
+        '''removes the monomial m, if a payload is given only the entry
+        carrying this very object. Raises KeyError if there is no such
+        entry.'''
+        path = []
+        node = self._root
+        for v in self._vars:
+            child = node.children.get(m[v])
+            if child is None:
+                raise KeyError(m)
+            path.append((node, m[v]))
+            node = child
+        if payload is None:
+            if not node:
+                raise KeyError(m)
+            node.pop()
+        else:
+            for i, p in enumerate(node):
+                if p is payload:
+                    del node[i]
+                    break
+            else:
+                raise KeyError(m)
+        self._size -= 1
+        # prune empty branches bottom up
+        empty = not node
+        for parent, d in reversed(path):
+            if not empty:
+                break
+            del parent.children[d]
+            parent.max = max(parent.children, default=None)
+            empty = not parent.children
+
+    def payloads(self, m):
+        '''all payloads stored with the monomial m'''
+        return list(self._leaf(m) or [])
+
+    def multipliers(self, m):
+        '''multipliers and nonmultipliers of m with respect to the monomials
+        in the tree, same result as 'vec_multipliers(m, M, vars)'.
+        '''
+        mult = []
+        node = self._root
+        for v in self._vars:
+            d = m[v]
+            if node is None:
+                # no other monomial in the class of m any more
+                if d == 0:
+                    mult.append(v)
+                continue
+            if d == node.max:
+                mult.append(v)
+            node = node.children.get(d)
+        return mult, list(sorted(set(self._vars) - set(mult)))
+
+    def janet_divisor(self, w):
+        '''Returns (u, payload) where u is the monomial in the tree which is
+        a Janet (involutive) divisor of w, i.e. w is u multiplied by
+        multiplicative variables of u only. This divisor is unique, None
+        if there is none.
+
+        >>> t = JanetTree((0, 1), [(0, 2), (2, 0), (1, 1)])
+        >>> t.janet_divisor((3, 0)), t.janet_divisor((1, 3))
+        (((2, 0), None), ((1, 1), None))
+        >>> t.janet_divisor((0, 3))
+        ((0, 2), None)
+        >>> t.janet_divisor((1, 0)) is None
+        True
+        '''
+        if not self._size:
+            return None
+        node = self._root
+        u    = [0]*len(self._vars)
+        for v in self._vars:
+            d = w[v]
+            if d in node.children:
+                u[v] = d
+            elif d > node.max:
+                # multiplicative for this branch
+                u[v] = node.max
+            else:
+                return None
+            node = node.children[u[v]]
+        return tuple(u), node[0]
+
+    def divisor(self, w):
+        '''Returns (u, payload) for some monomial u in the tree dividing w
+        (ordinary division), None if there is none. The search takes the
+        lowest possible degree first on each level.
+
+        >>> t = JanetTree((0, 1), [(0, 2), (2, 0), (1, 1)])
+        >>> t.divisor((1, 2)), t.divisor((3, 0))
+        (((0, 2), None), ((2, 0), None))
+        >>> t.divisor((1, 0)) is None
+        True
+        '''
+        u = [0]*len(self._vars)
+        last = len(self._vars) - 1
+
+        def search(node, level):
+            v = self._vars[level]
+            for d in sorted(node.children):
+                if d > w[v]:
+                    break
+                u[v] = d
+                child = node.children[d]
+                if level == last:
+                    return tuple(u), child[0]
+                found = search(child, level + 1)
+                if found is not None:
+                    return found
+            return None
+        return search(self._root, 0)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
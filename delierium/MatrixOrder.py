@@ -8,6 +8,9 @@ from sage.calculus.functional import diff
 from sage.modules.free_module_element import vector
 from sage.rings.polynomial.polynomial_ring_constructor import PolynomialRing
 from sage.rings.rational_field import QQ
+from sage.rings.fraction_field import FractionField
+from sage.symbolic.expression import Expression
+from sage.symbolic.ring import SR
 from sage.misc.prandom import shuffle
 from functools import cmp_to_key
 
@@ -16,8 +19,10 @@ import functools
 try:
     from delierium.helpers import eq, order_of_derivative, is_derivative, \
         is_function
+    from delierium.Caches import cached, caches
 except ModuleNotFoundError:
     from helpers import eq, order_of_derivative, is_derivative, is_function
+    from Caches import cached, caches
 
 import doctest
 #
@@ -104,58 +109,295 @@ def Mgrevlex(funcs, vars):
     return l
 
 
+# the ranking keys of each context, see Context.rank
+_rank_tables = caches.tables("rank", maxsize=2**16, max_scopes=16)
+
+
 class Context:
-    # XXX replace by named tuple? or attr.ib
-    def __init__ (self, dependent, independent, weight = Mgrevlex):
+    def __init__ (self, dependent, independent, weight = Mgrevlex,
+                  rational=False):
         """ sorting : (in)dependent [i] > dependent [i+i]
+
+        A context is immutable and compares by value, so equal contexts
+        share the same table of ranking keys.
+
+        If 'rational' is set, coefficients are kept in the fraction field of
+        the base field whenever they are rational functions of the
+        independent variables, see 'coefficient'.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> z = function("z")(x, y)
+        >>> c1, c2 = Context((w, z), (x, y)), Context((w, z), [x, y])
+        >>> c1 == c2, hash(c1) == hash(c2)
+        (True, True)
+        >>> c1 == Context((w, z), (x, y), Mgrlex)
+        False
+        >>> c1._weight = None
+        Traceback (most recent call last):
+        ...
+        AttributeError: Context is immutable
         """
-        # XXX maybe we can create the matrices here?
-        self._independent = tuple(independent)
-        self._dependent   = tuple((_.operator() if is_function(_) else _
-                                   for _ in dependent))
-        self._weight      = weight (self._dependent, self._independent)
-        self._basefield   = PolynomialRing(QQ, independent)
+        _set = functools.partial(object.__setattr__, self)
+        _set("_independent", tuple(independent))
+        _set("_dependent", tuple((_.operator() if is_function(_) else _
+                                  for _ in dependent)))
+        _set("_weight_function", weight)
+        _set("_weight", weight(self._dependent, self._independent))
+        _set("_basefield", PolynomialRing(QQ, independent))
+        _set("_rational", bool(rational))
+        _set("_coefficient_field",
+             FractionField(self._basefield) if rational else None)
+        _set("_rows", tuple(tuple(int(_) for _ in r)
+                            for r in self._weight.rows()))
+        _set("_signature", (tuple(str(_) for _ in self._dependent),
+                            tuple(str(_) for _ in self._independent),
+                            self._rows, self._rational))
+        _set("_hash", hash(self._signature))
+        _set("_ranking", _rank_tables.table(self))
 
-_cache={}
+    def __setattr__(self, name, value):
+        raise AttributeError("Context is immutable")
 
-#@functools.cache
-def higher(d1, d2, context):
-    # XXX move to context?
-    '''Algorithm 2.3 from [Schwarz].'''
-    @functools.cache
-    def analyze_dterm(dd):
-        if is_derivative(dd):
-            f = dd.operator().function()
-        elif is_function(dd):
-            f = dd.operator()
+    def __eq__(self, other):
+        return self is other or isinstance(other, Context) and \
+            self._signature == other._signature
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (Context, (self._dependent, self._independent,
+                          self._weight_function, self._rational))
+
+    def coefficient(self, c):
+        '''Converts a coefficient into the fraction field of the base field
+        if the context is 'rational' and c is a rational function of the
+        independent variables. Anything else (transcendental functions,
+        other symbols, functions of the dependent variables) stays in SR.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y), rational=True)
+        >>> c = ctx.coefficient(x/(2*y*(x**2+y)))
+        >>> c.parent() is ctx._coefficient_field
+        True
+        >>> ctx.coefficient(x.exp()).parent()
+        Symbolic Ring
+        >>> Context((w,), (x, y)).coefficient(x/y).parent()
+        Symbolic Ring
+        >>> Context((w,), (x, y)).coefficient(-1).parent()
+        Symbolic Ring
+        '''
+        K = self._coefficient_field
+        if K is None:
+            # numbers as well, Python ints would be divided into floats
+            return c if isinstance(c, Expression) else SR(c)
+        try:
+            return K(c)
+        except (TypeError, ValueError, AttributeError, NotImplementedError):
+            pass
+        try:
+            R = self._basefield
+            return K(R(c.numerator()), R(c.denominator()))
+        except (TypeError, ValueError, AttributeError, NotImplementedError):
+            return c
+
+    def simplify(self, c):
+        '''canonical form of a coefficient, only symbolic coefficients
+        need the expensive simplification'''
+        if isinstance(c, Expression):
+            return c.simplify()
+        return c
+
+    def is_zero(self, c):
+        '''zero test for a coefficient, exact coefficients don't need maxima
+        '''
+        if isinstance(c, Expression):
+            return eq(c, 0)
+        return not c
+
+    def differentiate(self, c, i):
+        '''derivative of a coefficient by the i-th independent variable
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> ctx = Context((w,), (x, y), rational=True)
+        >>> ctx.differentiate(ctx.coefficient(x/y), 1)
+        -x/y^2
+        >>> Context((w,), (x, y)).differentiate(y*x.exp(), 0)
+        y*e^x
+        '''
+        if isinstance(c, Expression):
+            return c.diff(self._independent[i])
+        if self._coefficient_field is not None and \
+           getattr(c, "parent", None) is not None and \
+           c.parent() is self._coefficient_field:
+            return c.derivative(self._basefield.gen(i))
+        # a number
+        return 0
+
+    def symbolic(self, c):
+        '''the coefficient as an element of SR, for display and for building
+        symbolic expressions'''
+        if self._coefficient_field is not None and \
+           getattr(c, "parent", None) is not None and \
+           c.parent() is self._coefficient_field:
+            return SR(c)
+        return c
+
+    def rank(self, key):
+        '''The ranking key of a derivative, i.e. the weight matrix applied
+        to the augmented vector of the _Dkey as a tuple of integers. Sorting
+        by it is the same as sorting with 'higher', the product is computed
+        only once per context and derivative. The table of a context is
+        the "rank" entry of the caches, caches.release(context) empties it.
+
+        >>> x, y = var("x y")
+        >>> w = function("w")(x, y)
+        >>> z = function("z")(x, y)
+        >>> ctx = Context((w, z), (x, y), Mgrlex)
+        >>> ctx.rank(_Dkey(1, (1, 2)))
+        (3, 1, 1, 2)
+        >>> ctx.rank(_Dkey(0, (0, 1))) > ctx.rank(_Dkey(1, (0, 1)))
+        True
+        >>> ctx.rank(_Dkey(1, (1, 2))) is ctx.rank(_Dkey(1, (1, 2)))
+        True
+        >>> caches.release(ctx); len(ctx._ranking)
+        0
+        '''
+        try:
+            return self._ranking[key]
+        except KeyError:
+            pass
+        if key is None:
+            # a pure coefficient is lower than any derivative
+            r = ()
         else:
-            f = [_ for _ in dd.operands() if is_function(_) or is_derivative(_)][0]
-            if is_derivative(f):
-                f = f.operator().function()
-        return f
-
-    def idx(d):
-        # faster than functools.cache
-        return context._dependent.index(analyze_dterm(d))
-
-    @functools.cache
-    def get_derivative_vector(d):
-        iv = [0]*len(context._dependent)
-        iv[idx(d)] += 1
-        return vector(order_of_derivative(d, len(context._independent)) + iv)
-    i1 = get_derivative_vector(d1)
-    i2 = get_derivative_vector(d2)
-    r = context._weight * vector(i1-i2)
-    for entry in r:
-        if entry:
-            return entry > 0
-    return False
-
-
-@functools.cache
+            v = list(key.order) + [0]*len(self._dependent)
+            v[len(key.order) + key.fidx] = 1
+            r = tuple(sum(a*b for a, b in zip(row, v)) for row in self._rows)
+        _rank_tables.store(self, self._ranking, key, r)
+        return r
+
+
+
+class _Dkey:
+    '''compact identity of a derivative: the index of the differentiated
+    function in context._dependent and the tuple of the orders with respect
+    to context._independent. The symbolic derivative is only built on demand,
+    see key_to_derivative.
+
+    >>> k = _Dkey(1, [2, 0, 1])
+    >>> k
+    _Dkey(1, (2, 0, 1))
+    >>> k == _Dkey(1, (2, 0, 1)), k == _Dkey(0, (2, 0, 1))
+    (True, False)
+    >>> k.prolong(1)
+    _Dkey(1, (2, 1, 1))
+    >>> k.divides(_Dkey(1, (3, 0, 1))), k.divides(_Dkey(1, (3, 0, 0)))
+    (True, False)
+    '''
+    __slots__ = ("fidx", "order", "_hash")
+
+    def __init__(self, fidx, order):
+        self.fidx  = fidx
+        self.order = tuple(order)
+        self._hash = hash((fidx, self.order))
+
+    def __eq__(self, other):
+        return isinstance(other, _Dkey) and self.fidx == other.fidx and \
+            self.order == other.order
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return "_Dkey(%s, %s)" % (self.fidx, self.order)
+
+    def prolong(self, i, k=1):
+        '''the key of the derivative differentiated k times by the i-th
+        independent variable'''
+        o = list(self.order)
+        o[i] += k
+        return _Dkey(self.fidx, o)
+
+    def divides(self, other):
+        '''True if other is a derivative of self'''
+        return self.fidx == other.fidx and \
+            all(a <= b for a, b in zip(self.order, other.order))
+
+    def difference(self, other):
+        '''the multi index which leads from other to self'''
+        return tuple(a - b for a, b in zip(self.order, other.order))
+
+
+@cached("derivative_to_key", maxsize=2**14, scope=1, max_scopes=16)
+def derivative_to_key(d, context):
+    '''Computes the _Dkey of a derivative (or a plain function) 'd'. For
+    products the (first) derivative inside is taken.
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> z = function("z")(x, y)
+    >>> ctx = Context((w, z), (x, y))
+    >>> derivative_to_key(diff(z, x, y, y), ctx)
+    _Dkey(1, (1, 2))
+    >>> derivative_to_key(w, ctx)
+    _Dkey(0, (0, 0))
+    '''
+    if not (is_derivative(d) or is_function(d)):
+        d = [_ for _ in d.operands() if is_function(_) or is_derivative(_)][0]
+    if is_derivative(d):
+        f = d.operator().function()
+    else:
+        f = d.operator()
+    return _Dkey(context._dependent.index(f),
+                 order_of_derivative(d, len(context._independent)))
+
+
+@cached("key_to_derivative", maxsize=2**14, scope=1, max_scopes=16)
+def key_to_derivative(key, context):
+    '''builds the symbolic derivative for a _Dkey, inverse of
+    derivative_to_key
+
+    >>> x, y = var("x y")
+    >>> w = function("w")(x, y)
+    >>> z = function("z")(x, y)
+    >>> ctx = Context((w, z), (x, y))
+    >>> key_to_derivative(_Dkey(1, (1, 2)), ctx)
+    diff(z(x, y), x, y, y)
+    >>> key_to_derivative(_Dkey(0, (0, 0)), ctx)
+    w(x, y)
+    '''
+    f = context._dependent[key.fidx](*context._independent)
+    vars = [v for v, o in zip(context._independent, key.order)
+            for _ in range(o)]
+    return diff(f, *vars) if vars else f
+
+
+def _as_key(d, context):
+    return d if isinstance(d, _Dkey) else derivative_to_key(d, context)
+
+
+def higher(d1, d2, context):
+    '''Algorithm 2.3 from [Schwarz].
+
+    d1 and d2 are either derivatives or _Dkey's. The first nonzero entry of
+    the weight matrix applied to the difference decides, which is the same
+    as comparing the precomputed ranking keys lexicographically.
+    '''
+    return context.rank(_as_key(d1, context)) > \
+        context.rank(_as_key(d2, context))
+
+
+@cached("sorter", maxsize=2**16, scope=2, max_scopes=16)
 def sorter(d1, d2, context=Mgrevlex):
-    '''sorts two derivatives d1 and d2 using the weight matrix M
-    according to the sort order given in the tuple of  dependent and
+    '''sorts two derivatives (or _Dkey's) d1 and d2 using the weight
+    matrix M according to the sort order given in the tuple of  dependent and
     independent variables
 
     >>> x, y, z = var("x y z")
@@ -188,8 +430,15 @@ def sorter(d1, d2, context=Mgrevlex):
     diff(u(x, y, z), x, x, x)
     diff(u(x, y, z), x, x, z, z)
     diff(u(x, y, z), x, y, y, z)
+    >>> # the same with a plain key sort
+    >>> s = sorted(l1, key=lambda d: ctxMgrevlex.rank(derivative_to_key(d, ctxMgrevlex)))
+    >>> for _ in s: print(_)
+    diff(u(x, y, z), z, z)
+    diff(u(x, y, z), x, x, x)
+    diff(u(x, y, z), x, x, z, z)
+    diff(u(x, y, z), x, y, y, z)
     '''
-    if eq(d1, d2):
+    if _as_key(d1, context) == _as_key(d2, context):
         return 1
     if higher(d1, d2, context):
         return 1
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Reproducible random homogeneous linear PDE systems for stress and scaling
+tests. The result of random_system feeds Janet_Basis directly:
+
+    S, dependent, independent = random_system(seed=42)
+    Janet_Basis(S, dependent, independent)
+
+Only Python's random module seeded with 'seed' is used, so the same
+parameters always give the same system.
+"""
+import random
+from itertools import product
+
+import sage.all
+from sage.calculus.var import var, function
+from sage.calculus.functional import diff
+
+COEFFICIENT_KINDS = ("constant", "polynomial", "rational")
+
+
+def multi_indices(n, order):
+    '''all multi indices of length n up to the given order, ascending by
+    order
+
+    >>> multi_indices(2, 2)
+    [(0, 0), (0, 1), (1, 0), (0, 2), (1, 1), (2, 0)]
+    '''
+    return sorted((_ for _ in product(range(order + 1), repeat=n)
+                   if sum(_) <= order), key=lambda _: (sum(_), _))
+
+
+def _derivative(f, independent, alpha):
+    vars = [x for x, a in zip(independent, alpha) for _ in range(a)]
+    return diff(f, *vars) if vars else f
+
+
+def _nonzero(rng, bound):
+    return rng.choice([_ for _ in range(-bound, bound + 1) if _])
+
+
+def _polynomial(rng, independent, degree, bound):
+    '''a random nonzero polynomial, at least one term has the full degree'''
+    monomials = multi_indices(len(independent), degree)
+    top = [_ for _ in monomials if sum(_) == degree]
+    chosen = {rng.choice(top)} | {m for m in monomials if rng.random() < 0.5}
+    p = 0
+    for m in sorted(chosen):
+        term = _nonzero(rng, bound)
+        for x, e in zip(independent, m):
+            term *= x**e
+        p += term
+    return p
+
+
+def _check_kind(kind):
+    if kind not in COEFFICIENT_KINDS:
+        raise ValueError("coefficient kind must be one of %s, not %r" %
+                         (", ".join(COEFFICIENT_KINDS), kind))
+
+
+def random_coefficient(rng, independent, kind="constant", degree=1, bound=5):
+    '''A random nonzero coefficient: an integer, a polynomial of the given
+    degree or a quotient of two such polynomials.'''
+    _check_kind(kind)
+    if kind == "constant":
+        return _nonzero(rng, bound)
+    if kind == "polynomial":
+        return _polynomial(rng, independent, degree, bound)
+    return _polynomial(rng, independent, degree, bound) / \
+        _polynomial(rng, independent, max(degree, 1), bound)
+
+
+def random_system(n_functions=1, n_independents=2, max_order=2,
+                  n_equations=2, coefficients="constant", density=0.3,
+                  seed=None, degree=1, bound=5):
+    '''Generates a random homogeneous linear PDE system.
+
+    Parameters:
+        * n_functions, n_independents: number of dependent functions
+          f0, f1, ... and of independent variables x0, x1, ...
+        * max_order: each equation contains a derivative of this order
+        * n_equations: number of equations
+        * coefficients: "constant", "polynomial" or "rational"
+        * density: probability of each derivative up to max_order (of all
+          functions) to appear in an equation
+        * seed: seed of the random generator
+        * degree, bound: degree of the polynomial coefficients and bound of
+          the integers in the coefficients
+
+    Returns (S, dependent, independent).
+
+    >>> S, dependent, independent = random_system(2, 3, seed=1)
+    >>> len(S), dependent, independent
+    (2, (f0(x0, x1, x2), f1(x0, x1, x2)), (x0, x1, x2))
+    >>> T = random_system(2, 3, seed=1)[0]
+    >>> [str(_) for _ in S] == [str(_) for _ in T]
+    True
+    >>> random_system(coefficients="trigonometric")
+    Traceback (most recent call last):
+    ...
+    ValueError: coefficient kind must be one of constant, polynomial, rational, not 'trigonometric'
+    '''
+    _check_kind(coefficients)
+    rng = random.Random(seed)
+    independent = tuple(var("x%s" % i) for i in range(n_independents))
+    dependent = tuple(function("f%s" % i)(*independent)
+                      for i in range(n_functions))
+    derivatives = [(i, alpha) for i in range(n_functions)
+                   for alpha in multi_indices(n_independents, max_order)]
+    highest = [_ for _ in derivatives if sum(_[1]) == max_order]
+    S = []
+    for _ in range(n_equations):
+        terms = {rng.choice(highest)}
+        terms |= {d for d in derivatives if rng.random() < density}
+        e = 0
+        for i, alpha in sorted(terms):
+            e += random_coefficient(rng, independent, coefficients, degree,
+                                    bound) * \
+                _derivative(dependent[i], independent, alpha)
+        S.append(e)
+    return S, dependent, independent
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
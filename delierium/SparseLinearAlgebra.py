@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Sparse linear algebra on linear differential polynomials.
+
+A row is a dict {_Dkey: coefficient}, i.e. a differential polynomial whose
+columns are the (ranked) derivatives. 'rank' is a function mapping a key to
+its ranking key, usually Context.rank. The coefficients only need field
+arithmetic, so this works for rational numbers as well as for elements of a
+fraction field.
+
+For constant coefficients differentiation is just a shift of the keys, so a
+Janet basis can be computed without any symbolic computation at all, see
+constant_janet_basis.
+"""
+from fractions import Fraction
+
+try:
+    from delierium.JanetTree import JanetTree
+except ModuleNotFoundError:
+    from JanetTree import JanetTree
+
+
+def _not(c):
+    return not c
+
+
+def _same(c):
+    return c
+
+
+def leader(row, rank):
+    '''the highest key of a row'''
+    return max(row, key=rank)
+
+
+def shift(key, multi_index):
+    '''the key differentiated by the multi index'''
+    for i, k in enumerate(multi_index):
+        if k:
+            key = key.prolong(i, k)
+    return key
+
+
+def prolong(row, multi_index):
+    '''derivative of a row with constant coefficients'''
+    return {shift(k, multi_index): c for k, c in row.items()}
+
+
+def _inverse(c):
+    '''1/c in the field of c, Python ints give Fractions instead of
+    floats'''
+    return Fraction(1, c) if isinstance(c, int) else 1 / c
+
+
+def monic(row, rank, normal=_same):
+    '''the row multiplied by the inverse of its leading coefficient
+
+    >>> monic({2: 2, 0: -1}, lambda k: k)
+    {2: Fraction(1, 1), 0: Fraction(-1, 2)}
+    '''
+    inverse = _inverse(row[leader(row, rank)])
+    return {k: normal(v * inverse) for k, v in row.items()}
+
+
+def axpy(row, factor, other, is_zero=_not, normal=_same):
+    '''row - factor * other, in place, vanishing entries are removed'''
+    for k, c in other.items():
+        v = normal(row.get(k, 0) - factor * c)
+        if is_zero(v):
+            row.pop(k, None)
+        else:
+            row[k] = v
+    return row
+
+
+def eliminate(row, pivots, rank, is_zero=_not, normal=_same):
+    '''Eliminates all keys of 'row' which are leaders of 'pivots', a dict
+    {leader: monic row}, from the highest to the lowest.'''
+    row = dict(row)
+    while True:
+        keys = [k for k in row if k in pivots]
+        if not keys:
+            return row
+        k = max(keys, key=rank)
+        axpy(row, row.pop(k), {_: c for _, c in pivots[k].items() if _ != k},
+             is_zero, normal)
+
+
+def echelon(rows, rank, is_zero=_not, normal=_same):
+    '''The reduced row echelon form of 'rows': monic rows with pairwise
+    different leaders, no row contains the leader of another one. Zero rows
+    are dropped, the result is sorted by descending leaders.
+
+    >>> from fractions import Fraction as F
+    >>> rank = lambda k: k
+    >>> echelon([{3: F(1), 1: F(1)}, {3: F(2), 1: F(-1), 0: F(3)},
+    ...          {1: F(3), 0: F(1)}], rank)
+    [{3: Fraction(1, 1)}, {1: Fraction(1, 1)}, {0: Fraction(1, 1)}]
+    >>> echelon([{2: F(2), 0: F(1)}, {2: F(4), 0: F(2)}], rank)
+    [{2: Fraction(1, 1), 0: Fraction(1, 2)}]
+    >>> echelon([{1: 2, 0: 1}, {1: 1, 0: -1}], rank)
+    [{1: Fraction(1, 1)}, {0: Fraction(1, 1)}]
+    '''
+    pivots = {}
+    for row in rows:
+        row = eliminate(row, pivots, rank, is_zero, normal)
+        if not row:
+            continue
+        row = monic(row, rank, normal)
+        l = leader(row, rank)
+        for p in pivots.values():
+            if l in p:
+                axpy(p, p[l], row, is_zero, normal)
+                p.pop(l, None)
+        pivots[l] = row
+    return [pivots[k] for k in sorted(pivots, key=rank, reverse=True)]
+
+
+class _Rows:
+    '''monic rows indexed by the leading key, one JanetTree per function'''
+    def __init__(self, nvars, rank):
+        self._nvars = nvars
+        self._rank  = rank
+        self._trees = {}
+        self.rows   = []
+
+    def insert(self, row):
+        k = leader(row, self._rank)
+        if k.fidx not in self._trees:
+            self._trees[k.fidx] = JanetTree(range(self._nvars))
+        self._trees[k.fidx].insert(k.order, row)
+        self.rows.append(row)
+
+    def delete(self, row):
+        k = leader(row, self._rank)
+        self._trees[k.fidx].delete(k.order, row)
+        self.rows = [_ for _ in self.rows if _ is not row]
+
+    def multipliers(self, row):
+        k = leader(row, self._rank)
+        return self._trees[k.fidx].multipliers(k.order)
+
+    def divisor(self, key, involutive):
+        tree = self._trees.get(key.fidx)
+        if tree is None:
+            return None
+        if involutive:
+            return tree.janet_divisor(key.order)
+        return tree.divisor(key.order)
+
+
+def normal_form(row, rows, rank, involutive=True, is_zero=_not):
+    '''Reduces all terms of 'row' with respect to the monic rows in the
+    _Rows 'rows'. Terms are eliminated from the highest to the lowest, an
+    elimination only introduces lower terms.'''
+    row = dict(row)
+    irreducible = set()
+    while True:
+        candidates = [k for k in row if k not in irreducible]
+        if not candidates:
+            return row
+        k = max(candidates, key=rank)
+        found = rows.divisor(k, involutive)
+        if found is None:
+            irreducible.add(k)
+            continue
+        u, g = found
+        axpy(row, row[k], prolong(g, tuple(a - b for a, b in zip(k.order, u))),
+             is_zero)
+
+
+def constant_janet_basis(rows, nvars, rank, is_zero=_not, checkpoint=None):
+    '''Computes the reduced Janet basis of a system of linear differential
+    polynomials with constant coefficients.
+
+    The involutive basis is computed as in Gerdt's algorithm: the lowest
+    pending row is reduced involutively, a nonzero remainder is inserted
+    (elements with a leader which is a proper multiple of the new leader
+    are moved back to the queue) and the nonmultiplicative prolongations
+    not yet done are queued. The result is then autoreduced: elements with
+    a leader divisible by another leader are dropped and all tails are
+    reduced, so it is the unique autoreduced basis with monic leaders,
+    sorted ascending.
+
+    'rows' are dicts {_Dkey: coefficient}, nvars is the number of
+    independent variables, rank the ranking function of the keys.
+    'checkpoint' is called with the number of rows of the basis before each
+    row taken from the queue and each tail reduced, it can raise to stop.
+    '''
+    T       = _Rows(nvars, rank)
+    queue   = [dict(_) for _ in rows if _]
+    # prolongations done, by id of the row; the row itself is kept alive
+    # so its id can not be reused after it was moved back to the queue
+    history = {}
+    while queue:
+        if checkpoint is not None:
+            checkpoint(len(T.rows))
+        queue.sort(key=lambda r: rank(leader(r, rank)))
+        p = queue.pop(0)
+        h = normal_form(p, T, rank, True, is_zero)
+        if not h:
+            continue
+        h = monic(h, rank)
+        l = leader(h, rank)
+        for g in list(T.rows):
+            lg = leader(g, rank)
+            if lg != l and l.divides(lg):
+                T.delete(g)
+                queue.append(g)
+        T.insert(h)
+        for g in T.rows:
+            done = history.setdefault(id(g), (g, set()))[1]
+            for n in T.multipliers(g)[1]:
+                if n in done:
+                    continue
+                done.add(n)
+                mi = [0]*nvars
+                mi[n] = 1
+                queue.append(prolong(g, mi))
+    # T is involutive, hence a Groebner basis, now autoreduce
+    leaders = [(leader(g, rank), g) for g in T.rows]
+    minimal = [g for l, g in leaders
+               if not any(m != l and m.divides(l) for m, _ in leaders)]
+    result = []
+    for g in minimal:
+        if checkpoint is not None:
+            checkpoint(len(minimal))
+        others = _Rows(nvars, rank)
+        for _ in minimal:
+            if _ is not g:
+                others.insert(_)
+        l = leader(g, rank)
+        tail = {k: c for k, c in g.items() if k != l}
+        tail = normal_form(tail, others, rank, False, is_zero)
+        tail[l] = g[l]
+        result.append(tail)
+    return sorted(result, key=lambda r: rank(leader(r, rank)))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Opt-in instrumentation of the Janet basis computation.
+
+A Stats object records one event per phase run (wall time, the outer
+iteration it belongs to and the change of some counters during the phase),
+by default the calls of 'eq' and the Maxima comparisons behind it, i.e. the
+calls which missed its cache. The events can be summarized per phase or per
+iteration and exported as JSON or in the Chrome trace event format
+(chrome://tracing, https://ui.perfetto.dev).
+"""
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    from delierium.Caches import caches
+except ModuleNotFoundError:
+    from Caches import caches
+
+
+def _eq_calls():
+    s = caches["eq"].stats()
+    return s["hits"] + s["misses"]
+
+
+def _maxima_comparisons():
+    return caches["eq"].stats()["misses"]
+
+
+default_probes = {"eq_calls": _eq_calls,
+                  "maxima_comparisons": _maxima_comparisons}
+
+
+class Stats:
+    '''Wall time and counters per phase and outer iteration.
+
+    >>> ticks = iter(range(0, 100, 5))
+    >>> n = [0]
+    >>> stats = Stats(clock=lambda: next(ticks), probes={"n": lambda: n[0]})
+    >>> stats.next_iteration()
+    >>> with stats.phase("Autoreduce"):
+    ...     n[0] += 3
+    >>> with stats.phase("reduceS"):
+    ...     pass
+    >>> stats.next_iteration()
+    >>> with stats.phase("Autoreduce"):
+    ...     n[0] += 1
+    >>> stats.summary()["Autoreduce"]
+    {'calls': 2, 'time': 10, 'n': 4}
+    >>> [sorted(_) for _ in stats.per_iteration()]
+    [['Autoreduce', 'reduceS'], ['Autoreduce']]
+    >>> stats.to_chrome_trace()["traceEvents"][0]["dur"]
+    5000000
+    '''
+    def __init__(self, clock=time.perf_counter, probes=None):
+        self._clock    = clock
+        self._probes   = default_probes if probes is None else probes
+        self._start    = clock()
+        self.iteration = 0
+        self.events    = []
+
+    def next_iteration(self):
+        '''marks the begin of the next outer iteration'''
+        self.iteration += 1
+
+    @contextmanager
+    def phase(self, name):
+        '''records the wall time and the counter changes of the block'''
+        before = {k: p() for k, p in self._probes.items()}
+        start  = self._clock()
+        try:
+            yield
+        finally:
+            end = self._clock()
+            self.events.append({
+                "name": name, "iteration": self.iteration,
+                "start": start - self._start, "time": end - start,
+                "counters": {k: p() - before[k]
+                             for k, p in self._probes.items()}})
+
+    @staticmethod
+    def _add(table, event):
+        entry = table.setdefault(event["name"],
+                                 dict({"calls": 0, "time": 0},
+                                      **{k: 0 for k in event["counters"]}))
+        entry["calls"] += 1
+        entry["time"]  += event["time"]
+        for k, v in event["counters"].items():
+            entry[k] += v
+
+    def summary(self):
+        '''{phase: {"calls", "time", counters...}} over all iterations'''
+        result = {}
+        for event in self.events:
+            self._add(result, event)
+        return result
+
+    def per_iteration(self):
+        '''the summaries of the outer iterations 1, 2, ...'''
+        result = [{} for _ in range(self.iteration)]
+        for event in self.events:
+            if event["iteration"]:
+                self._add(result[event["iteration"] - 1], event)
+        return result
+
+    def as_dict(self):
+        return {"iterations": self.iteration,
+                "summary": self.summary(),
+                "per_iteration": self.per_iteration(),
+                "events": self.events}
+
+    def to_json(self, fp=None, **kwargs):
+        '''the statistics as JSON, written to the file object fp if given'''
+        if fp is None:
+            return json.dumps(self.as_dict(), **kwargs)
+        json.dump(self.as_dict(), fp, **kwargs)
+
+    def to_chrome_trace(self, fp=None):
+        '''the events in the Chrome trace event format (times in
+        microseconds), written as JSON to the file object fp if given'''
+        trace = {"traceEvents": [
+            {"name": e["name"], "ph": "X", "pid": 0, "tid": 0,
+             "ts": e["start"] * 10**6, "dur": e["time"] * 10**6,
+             "args": dict(e["counters"], iteration=e["iteration"])}
+            for e in self.events], "displayTimeUnit": "ms"}
+        if fp is None:
+            return trace
+        json.dump(trace, fp)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,7 +1,53 @@
-from .MatrixOrder import Mlex, Mgrlex, Mgrevlex, Context, higher, sorter
-from .helpers import tangent_vector, order_of_derivative, is_derivative, \
-    is_function, eq
-from .JanetBasis import _Dterm, _Differential_Polynomial, Autoreduce, \
-    Reorder, vec_multipliers, vec_degree, \
-    derivative_to_vec, complete, CompleteSystem, Janet_Basis
-from .DerivativeOperators import FrechetD, EulerD
+"""
+The submodules are imported on first access of one of their names, so
+'import delierium' itself is cheap and doesn't start Sage:
+
+    import delierium
+    delierium.Janet_Basis(...)      # imports delierium.JanetBasis
+"""
+import importlib
+
+from ._version import __version__
+# pure Python, and importing them later would bind the package attributes
+# to the submodules instead of the classes of the same name
+from .JanetTree import JanetTree
+from .DiskCache import DiskCache
+
+_exports = {
+    "MatrixOrder": ["Mlex", "Mgrlex", "Mgrevlex", "Context", "higher",
+                    "sorter", "_Dkey", "derivative_to_key",
+                    "key_to_derivative"],
+    "helpers": ["tangent_vector", "order_of_derivative", "is_derivative",
+                "is_function", "eq"],
+    "JanetBasis": ["_Dterm", "_Differential_Polynomial", "Autoreduce",
+                   "Reorder", "vec_multipliers", "vec_degree",
+                   "derivative_to_vec", "complete", "CompleteSystem",
+                   "Janet_Basis", "Step", "Interrupted"],
+    "Caches": ["caches", "cached"],
+    "Statistics": ["Stats"],
+    "RandomSystems": ["random_system"],
+    "Batch": ["janet_basis_many", "BatchResult"],
+    "SparseLinearAlgebra": ["constant_janet_basis"],
+    "DerivativeOperators": ["FrechetD", "EulerD"],
+}
+_modules = {name: module for module, names in _exports.items()
+            for name in names}
+
+__all__ = ["__version__", "JanetTree", "DiskCache"] + list(_modules)
+
+
+def __getattr__(name):
+    if name in _exports:
+        return importlib.import_module("." + name, __name__)
+    try:
+        module = _modules[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name)) from None
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules) | set(_exports))
@@ -7,14 +7,14 @@ from functools import reduce
 from operator import __mul__
 import more_itertools
 import re
-from sage.misc.html import html
-from IPython.core.debugger import set_trace
 import sage.symbolic.operators
-from sage.graphs.graph import Graph
-from anytree import Node, RenderTree, AnyNode, NodeMixin, PreOrderIter
+try:
+    from delierium.Caches import cached
+except ModuleNotFoundError:
+    from Caches import cached
 
 
-@functools.cache
+@cached("eq", maxsize=2**16)
 def eq(d1, d2):
     '''This cheap trick gives as a lot of performance gain (> 80%!)
     because maxima comparisons are expensive,and we can expect
@@ -141,7 +141,7 @@ def compactify(*vars):
     return result
 
 
-@functools.cache
+@cached("adiff", maxsize=2**12, scope=1, max_scopes=16)
 def adiff(f, context, *vars):
     use_func_diff = any("NewSymbolicFunction" in v.__class__.__name__ for v in vars)
     for op in f.operands():
@@ -227,6 +227,7 @@ class ExpressionGraph:
     and adapted accordingly, quick 'n dirty
     '''
     def __init__(self, expr):
+        from sage.graphs.graph import Graph
         self.G = Graph()
         self.i = 0
         self.expr = expr
@@ -376,6 +377,9 @@ class ExpressionTree:
     and adapted accordingly, quick 'n dirty
     '''
     def __init__(self, expr):
+        from anytree import Node, PreOrderIter
+        # imported here once, not for each subexpression in _expand
+        self._Node = Node
         self.root = None
         self.latex_names = {}        
         self.gschisti = set()
@@ -406,7 +410,7 @@ class ExpressionTree:
         except AttributeError:
             self.latex_names[str(e)] = e._latex_()
             
-        n = Node(str(e), value = e, operator = opr, parent = parent, latex = l)
+        n = self._Node(str(e), value = e, operator = opr, parent = parent, latex = l)
         self.root = n if self.root is None else self.root
         if opr is not None:
             try:
@@ -6,9 +6,13 @@ here = pathlib.Path(__file__).parent.resolve()
 # Get the long description from the README file
 long_description = (here / 'README.md').read_text(encoding='utf-8')
 
+# single source of the version, also used to invalidate the disk cache
+version = {}
+exec((here / 'delierium' / '_version.py').read_text(encoding='utf-8'), version)
+
 setup(
     name="delierium",
-    version="0.1.0",
+    version=version["__version__"],
     description="Symmetry Analysis for ODEs using SageMath",
     long_description=long_description,
     long_description_content_type='text/markdown',